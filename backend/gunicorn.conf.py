@@ -0,0 +1,34 @@
+"""
+Gunicorn settings: load the app and the current model once in the master,
+then fork workers that share those pages copy-on-write.
+
+Workers still stat() the registry pointer on every prediction, so a model
+published after boot is picked up by each worker on its own.
+"""
+import gc
+import os
+
+preload_app = True
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+
+
+def when_ready(server):
+    from medical_app.ml_model import get_model
+
+    ml_model = get_model()
+    if ml_model.warm_up():
+        server.log.info("Model %s loaded and warmed up", ml_model.version)
+    else:
+        server.log.warning("No trained model found; workers will report not ready")
+
+    # Move everything allocated so far out of the collector's reach: its
+    # bookkeeping writes would otherwise copy the shared pages in each worker
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Never share the master's database sockets with the workers
+    from django.db import connections
+    connections.close_all()
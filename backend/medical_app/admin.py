@@ -1,8 +1,13 @@
 from django.contrib import admin
-from .models import PatientData
+from .models import PatientData, TrainingJob
 
 @admin.register(PatientData)
 class PatientDataAdmin(admin.ModelAdmin):
     list_display = ['id', 'age', 'gender', 'diagnosis', 'created_at']
     list_filter = ['gender', 'diagnosis', 'created_at']
-    search_fields = ['diagnosis']
\ No newline at end of file
+    search_fields = ['diagnosis']
+
+@admin.register(TrainingJob)
+class TrainingJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'status', 'mode', 'accuracy', 'created_at', 'duration_seconds']
+    list_filter = ['status', 'mode', 'created_at']
\ No newline at end of file
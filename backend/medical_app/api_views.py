@@ -1,23 +1,40 @@
+import time
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .models import PatientData
-from .serializers import PredictionRequestSerializer, PredictionResponseSerializer, PatientDataSerializer
-from .ml_model import MedicalDiagnosisModel
+from .models import PatientData, TrainingJob
+from .serializers import PredictionRequestSerializer, PredictionResponseSerializer, PatientDataSerializer, BatchPredictionRequestSerializer, TrainingJobSerializer, BulkPrescriptionRequestSerializer, TrainRequestSerializer, ConfirmDiagnosisSerializer
+from .ml_model import STAGE_METRIC, get_model
+from .filters import filter_history, parse_fields
+from .metrics import metrics
+from .pagination import HistoryCursorPagination
+from .training_jobs import reap_stale_jobs, submit_training_job
+from .write_buffer import save_prediction
 
-ml_model = MedicalDiagnosisModel()
+ml_model = get_model()
 
 
 @api_view(['POST'])
 def train_model_api(request):
-    """Train the ML model"""
+    """Start a background training job (optional "mode", "source" and "rebuild")"""
+    serializer = TrainRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
     try:
-        accuracy = ml_model.train_model()
+        job = submit_training_job(
+            ml_model,
+            serializer.validated_data['mode'],
+            serializer.validated_data['source'],
+            serializer.validated_data['rebuild']
+        )
         return Response({
             'success': True,
-            'accuracy': round(accuracy * 100, 2),
-            'message': 'Model trained successfully'
-        })
+            'job_id': job.id,
+            'status': job.status,
+            'message': 'Training started'
+        }, status=status.HTTP_202_ACCEPTED)
     except Exception as e:
         return Response({
             'success': False,
@@ -25,69 +42,127 @@ def train_model_api(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+def training_job_api(request, job_id):
+    """Get the status of a training job"""
+    try:
+        reap_stale_jobs()
+        job = TrainingJob.objects.get(id=job_id)
+        serializer = TrainingJobSerializer(job)
+        return Response(serializer.data)
+    except TrainingJob.DoesNotExist:
+        return Response({
+            'error': 'Training job not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['POST'])
 def predict_api(request):
-    """Make a prediction"""
-    serializer = PredictionRequestSerializer(data=request.data)
+    """Make a prediction (?explain=1 adds the decision path)"""
+    with metrics.span(STAGE_METRIC, stage='validate'):
+        serializer = PredictionRequestSerializer(data=request.data)
+        valid = serializer.is_valid()
     
-    if not serializer.is_valid():
+    if not valid:
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     try:
         patient_data = serializer.validated_data
         
-        # Prepare data for ML model
-        ml_data = {
-            'age': patient_data['age'],
-            'gender': patient_data['gender'],
-            'glucose': patient_data['glucose'],
-            'cholesterol': patient_data['cholesterol'],
-            'triglycerides': patient_data['triglycerides'],
-            'creatinine': patient_data['creatinine'],
-            'uree': patient_data['uree'],
-            'uric_acid': patient_data['uric_acid'],
-            'got': patient_data['got'],
-            'gpt': patient_data['gpt'],
-            'bilirubin': patient_data['bilirubin'],
-            'smoking': 1 if patient_data['smoking'] else 0,
-            'obesity': 1 if patient_data['obesity'] else 0,
-            'family_history': 1 if patient_data['family_history'] else 0,
-        }
-        
         # Make prediction
-        diagnosis, probabilities = ml_model.predict(ml_data)
+        explain = request.query_params.get('explain') in ('1', 'true')
+        start = time.perf_counter()
+        if explain:
+            diagnosis, probabilities, decision_path = ml_model.predict(patient_data, explain=True)
+        else:
+            diagnosis, probabilities = ml_model.predict(patient_data)
+        inference_ms = (time.perf_counter() - start) * 1000
         
         if not diagnosis:
             return Response({
                 'error': 'Model not trained or prediction failed'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
-        # Save to database
-        patient = PatientData.objects.create(
-            age=patient_data['age'],
-            gender=patient_data['gender'],
-            glucose=patient_data['glucose'],
-            cholesterol=patient_data['cholesterol'],
-            triglycerides=patient_data['triglycerides'],
-            creatinine=patient_data['creatinine'],
-            uree=patient_data['uree'],
-            uric_acid=patient_data['uric_acid'],
-            got=patient_data['got'],
-            gpt=patient_data['gpt'],
-            bilirubin=patient_data['bilirubin'],
-            smoking=patient_data['smoking'],
-            obesity=patient_data['obesity'],
-            family_history=patient_data['family_history'],
-            diagnosis=diagnosis,
-            prediction_made=True
-        )
+        # Save to database (batched with concurrent requests when PREDICTION_WRITE_BUFFER is on)
+        with metrics.span(STAGE_METRIC, stage='db_write'):
+            patient = save_prediction(
+                **patient_data,
+                diagnosis=diagnosis,
+                probabilities=probabilities,
+                model_version=ml_model.version,
+                inference_ms=inference_ms,
+                prediction_made=True
+            )
         
         # Return response
-        return Response({
+        data = {
             'id': patient.id,
             'diagnosis': diagnosis,
             'probabilities': probabilities,
             'created_at': patient.created_at
+        }
+        if explain:
+            data['decision_path'] = decision_path
+        return Response(data)
+        
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+def predict_batch_api(request):
+    """Make predictions for many patients in one request"""
+    with metrics.span(STAGE_METRIC, stage='batch_validate'):
+        serializer = BatchPredictionRequestSerializer(data=request.data)
+        valid = serializer.is_valid()
+    
+    if not valid:
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        patients_data = serializer.validated_data['patients']
+        
+        # One vectorized pass through the model for the whole batch
+        start = time.perf_counter()
+        results = ml_model.predict_batch(patients_data)
+        inference_ms = (time.perf_counter() - start) * 1000 / max(len(patients_data), 1)
+        
+        if results is None:
+            return Response({
+                'error': 'Model not trained or prediction failed'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        # Save all rows in a single INSERT
+        with metrics.span(STAGE_METRIC, stage='batch_db_write'):
+            patients = PatientData.objects.bulk_create([
+                PatientData(
+                    **patient_data,
+                    diagnosis=diagnosis,
+                    probabilities=probabilities,
+                    model_version=ml_model.version,
+                    inference_ms=inference_ms,
+                    prediction_made=True
+                )
+                for patient_data, (diagnosis, probabilities) in zip(patients_data, results)
+            ])
+        
+        return Response({
+            'count': len(patients),
+            'results': [
+                {
+                    'id': patient.id,
+                    'diagnosis': diagnosis,
+                    'probabilities': probabilities,
+                    'created_at': patient.created_at
+                }
+                for patient, (diagnosis, probabilities) in zip(patients, results)
+            ]
         })
         
     except Exception as e:
@@ -98,11 +173,27 @@ def predict_api(request):
 
 @api_view(['GET'])
 def history_api(request):
-    """Get prediction history"""
+    """Get prediction history (cursor paginated, filterable, projectable)"""
     try:
-        patients = PatientData.objects.filter(prediction_made=True).order_by('-created_at')
-        serializer = PatientDataSerializer(patients, many=True)
-        return Response(serializer.data)
+        try:
+            fields = parse_fields(request.query_params.get('fields'))
+            patients = filter_history(
+                PatientData.objects.filter(prediction_made=True),
+                request.query_params
+            )
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if fields is not None:
+            # The cursor needs the ordering columns
+            patients = patients.only(*set(fields) | {'id', 'created_at'})
+        
+        paginator = HistoryCursorPagination()
+        page = paginator.paginate_queryset(patients, request)
+        serializer = PatientDataSerializer(page, many=True, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
     except Exception as e:
         return Response({
             'error': str(e)
@@ -126,33 +217,100 @@ def result_detail_api(request, patient_id):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['POST'])
+def confirm_diagnosis_api(request, patient_id):
+    """Confirm (or correct) a diagnosis so the case can be used for training"""
+    serializer = ConfirmDiagnosisSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        patient = PatientData.objects.get(id=patient_id, prediction_made=True)
+        patient.diagnosis = serializer.validated_data.get('diagnosis', patient.diagnosis)
+        patient.diagnosis_confirmed = True
+        patient.confirmed_at = timezone.now()
+        patient.save(update_fields=['diagnosis', 'diagnosis_confirmed', 'confirmed_at'])
+        return Response(PatientDataSerializer(patient).data)
+    except PatientData.DoesNotExist:
+        return Response({
+            'error': 'Patient not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['GET'])
 def health_check(request):
-    """Health check endpoint"""
+    """
+    Health check endpoint. Always 200 for liveness; with ?ready=1 it answers
+    503 until this worker has a model loaded, for readiness probes.
+    """
+    model_loaded = ml_model.ensure_current()
+    response_status = status.HTTP_200_OK
+    if request.query_params.get('ready') and not model_loaded:
+        response_status = status.HTTP_503_SERVICE_UNAVAILABLE
+    
     return Response({
         'status': 'healthy',
         'service': 'Medical Diagnosis API',
-        'version': '2.0'
-    })
+        'version': '2.0',
+        'model_loaded': model_loaded,
+        'model_version': ml_model.version if model_loaded else None,
+    }, status=response_status)
+
+
+import csv
+import json
+import zlib
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, JsonResponse, HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from django.views.decorators.http import condition
+from .ml_model import TREE_IMAGE_FORMATS
+from .render_cache import get_prescription_cache
+from .bulk_prescriptions import stream_zip
+from .streaming import StreamingResponse
+from .utils import generate_pdf, generate_bulk_pdf, generate_prescription_image, prescription_cache_key
+
+prescription_cache = get_prescription_cache()
+
+
+def _cached_prescription(request, patient, kind, suffix, render):
+    """
+    Return (etag, document bytes) for a rendered prescription, or (etag, None)
+    when the client already holds the current version.
+    """
+    key = prescription_cache_key(patient, kind)
+    etag = f'"{key}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        return etag, None
+    # Bytes rather than a path: another worker's eviction may delete the file
+    return etag, prescription_cache.read_or_render(key, suffix, lambda: render(patient).getvalue())
+
 
+def _prescription_response(response, etag):
+    response['ETag'] = etag
+    # Patient data: browser cache only, revalidated against the ETag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
-from django.http import FileResponse, JsonResponse, HttpResponse
-from .utils import generate_pdf, generate_prescription_image
 
 def download_prescription_pdf(request, patient_id):
     """Generate and download prescription PDF"""
     try:
         patient = PatientData.objects.get(id=patient_id, prediction_made=True)
-        buffer = generate_pdf(patient)
+        etag, content = _cached_prescription(request, patient, 'pdf', '.pdf', generate_pdf)
+        if content is None:
+            return _prescription_response(HttpResponseNotModified(), etag)
         
         filename = f"Ordonnance_Patient_{patient_id}_{patient.created_at.strftime('%Y-%m-%d')}.pdf"
         
-        return FileResponse(
-            buffer, 
-            as_attachment=False, 
-            filename=filename,
-            content_type='application/pdf'
-        )
+        response = HttpResponse(content, content_type='application/pdf')
+        response['Content-Disposition'] = f'inline; filename="{filename}"'
+        return _prescription_response(response, etag)
     except PatientData.DoesNotExist:
         return JsonResponse({
             'error': 'Patient not found'
@@ -166,9 +324,11 @@ def view_prescription_image(request, patient_id):
     """Generate and view prescription image"""
     try:
         patient = PatientData.objects.get(id=patient_id, prediction_made=True)
-        buffer = generate_prescription_image(patient)
+        etag, content = _cached_prescription(request, patient, 'png', '.png', generate_prescription_image)
+        if content is None:
+            return _prescription_response(HttpResponseNotModified(), etag)
         
-        return HttpResponse(buffer.getvalue(), content_type="image/png")
+        return _prescription_response(HttpResponse(content, content_type="image/png"), etag)
     except PatientData.DoesNotExist:
         return JsonResponse({
             'error': 'Patient not found'
@@ -177,3 +337,222 @@ def view_prescription_image(request, patient_id):
         return JsonResponse({
             'error': str(e)
         }, status=500)
+
+BULK_PRESCRIPTION_MAX = 500
+
+
+@api_view(['POST'])
+def bulk_prescriptions_api(request):
+    """Prescriptions for many patients: one multi-page PDF or a ZIP archive"""
+    serializer = BulkPrescriptionRequestSerializer(data=request.data)
+    
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        params = serializer.validated_data
+        patients = PatientData.objects.filter(prediction_made=True)
+        
+        if 'ids' in params:
+            patients = patients.filter(id__in=params['ids'])
+        else:
+            try:
+                patients = filter_history(patients, params)
+            except ValueError as e:
+                return Response({
+                    'error': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+        
+        patients = list(patients.order_by('created_at', 'id')[:BULK_PRESCRIPTION_MAX + 1])
+        if not patients:
+            return Response({
+                'error': 'No patients found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        if len(patients) > BULK_PRESCRIPTION_MAX:
+            return Response({
+                'error': f'Too many patients (max {BULK_PRESCRIPTION_MAX})'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if params['format'] == 'pdf':
+            return FileResponse(
+                generate_bulk_pdf(patients),
+                as_attachment=True,
+                filename='Ordonnances.pdf',
+                content_type='application/pdf'
+            )
+        
+        response = StreamingResponse(
+            stream_zip(patients, params['document']),
+            content_type='application/zip'
+        )
+        response['Content-Disposition'] = 'attachment; filename="Ordonnances.zip"'
+        return response
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _tree_image_etag(request, fmt):
+    if fmt not in TREE_IMAGE_FORMATS or not ml_model.ensure_current():
+        return None
+    return f"{ml_model.version}-{fmt}"
+
+
+@condition(etag_func=_tree_image_etag)
+def model_tree_image(request, fmt):
+    """Serve the decision tree image, rendered once per model version"""
+    try:
+        if fmt not in TREE_IMAGE_FORMATS:
+            return JsonResponse({
+                'error': 'Unsupported format'
+            }, status=404)
+        
+        path = ml_model.render_tree_image(fmt)
+        if path is None:
+            return JsonResponse({
+                'error': 'Model not trained' if ml_model.predictor is None else 'Current model is not a decision tree'
+            }, status=404)
+        
+        response = FileResponse(open(path, 'rb'), content_type=TREE_IMAGE_FORMATS[fmt])
+        # Same URL for every version: let clients cache but always revalidate the ETag
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+    except Exception as e:
+        return JsonResponse({
+            'error': str(e)
+        }, status=500)
+
+
+def _model_rules_etag(request):
+    if not ml_model.ensure_current():
+        return None
+    return f"{ml_model.version}-rules"
+
+
+@condition(etag_func=_model_rules_etag)
+def model_rules(request):
+    """Decision tree as if/then rules, one per leaf, extracted once per model version"""
+    try:
+        rules = ml_model.get_rules()
+        if rules is None:
+            return JsonResponse({
+                'error': 'Model not trained' if ml_model.predictor is None else 'Current model is not a decision tree'
+            }, status=404)
+        
+        diagnosis = request.GET.get('diagnosis')
+        if diagnosis:
+            rules = [rule for rule in rules if rule['diagnosis'] == diagnosis]
+        
+        response = JsonResponse({
+            'model_version': ml_model.version,
+            'count': len(rules),
+            'rules': rules
+        })
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+    except Exception as e:
+        return JsonResponse({
+            'error': str(e)
+        }, status=500)
+
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class _Echo:
+    """File-like object that hands back whatever csv.writer writes."""
+    def write(self, value):
+        return value
+
+
+def _export_lines(rows, columns, export_format):
+    if export_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        json_columns = [i for i, column in enumerate(columns) if column == 'probabilities']
+        for row in rows:
+            if json_columns:
+                row = list(row)
+                for i in json_columns:
+                    row[i] = json.dumps(row[i]) if row[i] is not None else ''
+            yield writer.writerow(row)
+    else:
+        encoder = DjangoJSONEncoder()
+        for row in rows:
+            yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+def _export_chunks(lines, compress):
+    """Group lines into ~64 KB chunks, gzip-compressing them on the fly if asked."""
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    batch = []
+    size = 0
+    
+    for line in lines:
+        batch.append(line)
+        size += len(line)
+        if size >= 65536:
+            data = ''.join(batch).encode('utf-8')
+            yield compressor.compress(data) if compressor else data
+            batch = []
+            size = 0
+    
+    data = ''.join(batch).encode('utf-8')
+    if compressor:
+        yield compressor.compress(data) + compressor.flush()
+    elif data:
+        yield data
+
+
+def export_history(request):
+    """Stream the prediction history as CSV or NDJSON, optionally gzipped"""
+    try:
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return JsonResponse({
+                'error': 'Unsupported format'
+            }, status=400)
+        compress = request.GET.get('gzip') in ('1', 'true')
+        
+        try:
+            columns = parse_fields(request.GET.get('fields')) or [
+                field.name for field in PatientData._meta.concrete_fields
+            ]
+            patients = filter_history(
+                PatientData.objects.filter(prediction_made=True),
+                request.GET
+            )
+        except ValueError as e:
+            return JsonResponse({
+                'error': str(e)
+            }, status=400)
+        
+        # Server-side cursor: rows are fetched in chunks, never all at once
+        rows = patients.order_by('id').values_list(*columns).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        
+        filename = f"historique.{export_format}"
+        content_type = EXPORT_FORMATS[export_format]
+        if compress:
+            filename += '.gz'
+            content_type = 'application/gzip'
+        
+        response = StreamingResponse(
+            _export_chunks(_export_lines(rows, columns, export_format), compress),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    except Exception as e:
+        return JsonResponse({
+            'error': str(e)
+        }, status=500)
+
+
+def metrics_view(request):
+    """Prometheus text exposition of this worker's metrics"""
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
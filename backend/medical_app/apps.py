@@ -1,5 +1,10 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 class MedicalAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'medical_app'
\ No newline at end of file
+    name = 'medical_app'
+
+    def ready(self):
+        from .db import configure_sqlite
+        connection_created.connect(configure_sqlite, dispatch_uid='medical_app.configure_sqlite')
@@ -0,0 +1,165 @@
+"""
+Async versions of the prediction, result and prescription endpoints, served
+under /api/async/ and meant for the ASGI entry point (medical_project/asgi.py).
+
+Database access goes through the async ORM, or the write buffer (write_buffer)
+when it is enabled. Model inference and document rendering are CPU-bound, so
+they run on a bounded thread pool (ASYNC_EXECUTOR_WORKERS) and the event loop
+keeps serving other requests.
+Requests and responses are the same as the sync views in api_views.
+"""
+import asyncio
+import functools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotAllowed, HttpResponseNotModified
+from rest_framework.renderers import JSONRenderer
+from .api_views import _cached_prescription, _prescription_response, ml_model
+from .ml_model import STAGE_METRIC
+from .metrics import metrics
+from .models import PatientData
+from .serializers import PatientDataSerializer, PredictionRequestSerializer
+from .utils import generate_pdf, generate_prescription_image
+from .write_buffer import asave_prediction
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'ASYNC_EXECUTOR_WORKERS', 4),
+            thread_name_prefix='async-cpu'
+        )
+    return _executor
+
+
+async def run_cpu(func, *args, **kwargs):
+    """Run a CPU-bound call on the executor without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def _json_response(data, status=200):
+    # Same encoding as DRF's Response in the sync views
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def _csrf_exempt(view):
+    # django.views.decorators.csrf.csrf_exempt wraps views in a sync function
+    # (before Django 5.0), which would hide that the view is async
+    view.csrf_exempt = True
+    return view
+
+
+@_csrf_exempt
+async def predict_api(request):
+    """Make a prediction (?explain=1 adds the decision path)"""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return _json_response({'error': 'Invalid JSON'}, status=400)
+
+    with metrics.span(STAGE_METRIC, stage='validate'):
+        serializer = PredictionRequestSerializer(data=payload)
+        valid = serializer.is_valid()
+
+    if not valid:
+        return _json_response(serializer.errors, status=400)
+
+    try:
+        patient_data = serializer.validated_data
+
+        explain = request.GET.get('explain') in ('1', 'true')
+        start = time.perf_counter()
+        result = await run_cpu(ml_model.predict, patient_data, explain=explain)
+        inference_ms = (time.perf_counter() - start) * 1000
+        diagnosis, probabilities = result[:2]
+
+        if not diagnosis:
+            return _json_response({
+                'error': 'Model not trained or prediction failed'
+            }, status=500)
+
+        with metrics.span(STAGE_METRIC, stage='db_write'):
+            patient = await asave_prediction(
+                **patient_data,
+                diagnosis=diagnosis,
+                probabilities=probabilities,
+                model_version=ml_model.version,
+                inference_ms=inference_ms,
+                prediction_made=True
+            )
+
+        data = {
+            'id': patient.id,
+            'diagnosis': diagnosis,
+            'probabilities': probabilities,
+            'created_at': patient.created_at
+        }
+        if explain:
+            data['decision_path'] = result[2]
+        return _json_response(data)
+
+    except Exception as e:
+        return _json_response({
+            'error': str(e)
+        }, status=500)
+
+
+async def result_detail_api(request, patient_id):
+    """Get specific result"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        patient = await PatientData.objects.aget(id=patient_id, prediction_made=True)
+        return _json_response(PatientDataSerializer(patient).data)
+    except PatientData.DoesNotExist:
+        return _json_response({
+            'error': 'Patient not found'
+        }, status=404)
+    except Exception as e:
+        return _json_response({
+            'error': str(e)
+        }, status=500)
+
+
+async def _prescription(request, patient_id, kind, suffix, render, content_type, filename=None):
+    try:
+        patient = await PatientData.objects.aget(id=patient_id, prediction_made=True)
+        etag, content = await run_cpu(_cached_prescription, request, patient, kind, suffix, render)
+        if content is None:
+            return _prescription_response(HttpResponseNotModified(), etag)
+
+        response = HttpResponse(content, content_type=content_type)
+        if filename:
+            response['Content-Disposition'] = f'inline; filename="{filename(patient)}"'
+        return _prescription_response(response, etag)
+    except PatientData.DoesNotExist:
+        return _json_response({
+            'error': 'Patient not found'
+        }, status=404)
+    except Exception as e:
+        return _json_response({
+            'error': str(e)
+        }, status=500)
+
+
+async def download_prescription_pdf(request, patient_id):
+    """Generate and download prescription PDF"""
+    return await _prescription(
+        request, patient_id, 'pdf', '.pdf', generate_pdf, 'application/pdf',
+        filename=lambda patient: f"Ordonnance_Patient_{patient_id}_{patient.created_at.strftime('%Y-%m-%d')}.pdf"
+    )
+
+
+async def view_prescription_image(request, patient_id):
+    """Generate and view prescription image"""
+    return await _prescription(
+        request, patient_id, 'png', '.png', generate_prescription_image, 'image/png'
+    )
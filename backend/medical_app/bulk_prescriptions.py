@@ -0,0 +1,117 @@
+"""
+Bulk prescription rendering for a batch of patients.
+
+Documents that are not already in the render cache are rendered in a process
+pool, since ReportLab and Pillow rendering is CPU-bound and holds the GIL. The
+worker function lives in utils, which does not touch the ORM, so the pool can
+use plain picklable snapshots of the patient rows.
+
+Workers are started by a forkserver (spawn where there is none), not forked
+from the server process: that one runs threads (write buffer, training,
+executors) whose locks a fork could copy in a held state.
+"""
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from django.conf import settings
+from .render_cache import get_prescription_cache
+from .utils import PRESCRIPTION_FIELDS, prescription_cache_key, render_document
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        workers = getattr(settings, 'PRESCRIPTION_RENDER_WORKERS', None) or os.cpu_count()
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+            # Workers fork from a server that has already imported the renderer
+            context.set_forkserver_preload(['medical_app.utils'])
+        else:
+            context = multiprocessing.get_context('spawn')
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    return _executor
+
+
+def _snapshot(patient):
+    values = {field: getattr(patient, field) for field in PRESCRIPTION_FIELDS}
+    return SimpleNamespace(created_at=patient.created_at, **values)
+
+
+def render_documents(patients, kind):
+    """
+    Yield (patient, document bytes) in input order, serving cached documents
+    directly and rendering the rest in parallel.
+    """
+    cache = get_prescription_cache()
+    suffix = f'.{kind}'
+    
+    keys = [prescription_cache_key(patient, kind) for patient in patients]
+    cached = [cache.get(key, suffix) for key in keys]
+    
+    missing = [patients[i] for i, path in enumerate(cached) if path is None]
+    rendered = iter(())
+    if missing:
+        rendered = get_executor().map(
+            render_document,
+            [kind] * len(missing),
+            [_snapshot(patient) for patient in missing],
+            chunksize=max(1, len(missing) // (4 * (os.cpu_count() or 1)))
+        )
+    
+    for patient, key, path in zip(patients, keys, cached):
+        if path is None:
+            data = next(rendered)
+            cache.put(key, suffix, data, evict=False)
+        else:
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                # Evicted by another worker since the lookup: render it here
+                data = render_document(kind, _snapshot(patient))
+                cache.put(key, suffix, data, evict=False)
+        yield patient, data
+    
+    if missing:
+        cache.evict()
+
+
+class _ZipStream:
+    """Write-only, non-seekable sink: zipfile then writes streaming-friendly data descriptors."""
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self._position
+    
+    def flush(self):
+        pass
+    
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(patients, kind):
+    """
+    Yield a ZIP archive with one prescription per patient, chunk by chunk.
+    PDF and PNG are already compressed, so entries are stored as-is.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for patient, data in render_documents(patients, kind):
+            name = f"Ordonnance_Patient_{patient.id}_{patient.created_at.strftime('%Y-%m-%d')}.{kind}"
+            archive.writestr(name, data)
+            yield stream.pop()
+    yield stream.pop()
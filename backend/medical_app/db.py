@@ -0,0 +1,16 @@
+"""Database connection setup, run for every new connection (connection_created)."""
+from django.conf import settings
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    Switch SQLite to write-ahead logging: readers no longer block on (or block)
+    the writer, and with synchronous=NORMAL a commit appends to the log without
+    an fsync (the log is synced at checkpoints). The journal mode persists in
+    the database file; synchronous has to be set on each connection.
+    """
+    if connection.vendor != 'sqlite' or not getattr(settings, 'SQLITE_WAL', True):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
@@ -0,0 +1,116 @@
+"""
+Declarative schema of the diagnosis model's features.
+
+INPUT_FEATURES is the single list of model inputs: the prediction serializer,
+PatientData.features(), the synthetic data and the training data reader all
+derive from it. DERIVED_FEATURES are ratios of inputs, filled in one vectorized
+pass by add_derived(). A feature matrix has the inputs first, then the derived
+columns, in declaration order (FEATURE_COLUMNS / COLUMN_INDEX).
+
+Adding a feature means adding a line here (plus the PatientData column and a
+migration for an input); the encoders below are compiled once at import.
+"""
+from collections import namedtuple
+import numpy as np
+
+# kind 'int' / 'float': options = (min, max); 'choice': options = sorted
+# choices, coded by position like a fitted LabelEncoder; 'bool': options = None
+Feature = namedtuple('Feature', ['name', 'kind', 'options'])
+Ratio = namedtuple('Ratio', ['name', 'numerator', 'denominator'])
+
+INPUT_FEATURES = [
+    Feature('age', 'int', (1, 120)),
+    Feature('gender', 'choice', ('F', 'M')),
+
+    # Lab results
+    Feature('glucose', 'float', (0.0, 30.0)),
+    Feature('cholesterol', 'float', (0.0, 15.0)),
+    Feature('triglycerides', 'float', (0.0, 10.0)),
+    Feature('creatinine', 'float', (0.0, 1000.0)),
+    Feature('uree', 'float', (0.0, 50.0)),
+    Feature('uric_acid', 'float', (0.0, 1000.0)),
+    Feature('got', 'float', (0.0, 500.0)),
+    Feature('gpt', 'float', (0.0, 500.0)),
+    Feature('bilirubin', 'float', (0.0, 100.0)),
+
+    # Risk factors
+    Feature('smoking', 'bool', None),
+    Feature('obesity', 'bool', None),
+    Feature('family_history', 'bool', None),
+]
+
+DERIVED_FEATURES = [
+    Ratio('got_gpt_ratio', 'got', 'gpt'),  # De Ritis ratio
+    Ratio('creatinine_uree_ratio', 'creatinine', 'uree'),
+]
+
+INPUT_NAMES = [feature.name for feature in INPUT_FEATURES]
+FEATURE_COLUMNS = INPUT_NAMES + [ratio.name for ratio in DERIVED_FEATURES]
+COLUMN_INDEX = {name: col for col, name in enumerate(FEATURE_COLUMNS)}
+GENDER_CLASSES = list(next(f.options for f in INPUT_FEATURES if f.name == 'gender'))
+
+# (column, name, {choice: code} or None) for every input
+_INPUT_COLUMNS = [
+    (COLUMN_INDEX[f.name], f.name, {choice: code for code, choice in enumerate(f.options)} if f.kind == 'choice' else None)
+    for f in INPUT_FEATURES
+]
+# (numerator, denominator) column indexes of every ratio, in declaration order
+_RATIO_COLUMNS = [(COLUMN_INDEX[r.numerator], COLUMN_INDEX[r.denominator]) for r in DERIVED_FEATURES]
+_RATIO_OUT = np.array([COLUMN_INDEX[r.name] for r in DERIVED_FEATURES], dtype=np.intp)
+_RATIO_NUMERATORS = np.array([numerator for numerator, _ in _RATIO_COLUMNS], dtype=np.intp)
+_RATIO_DENOMINATORS = np.array([denominator for _, denominator in _RATIO_COLUMNS], dtype=np.intp)
+
+
+def add_derived(X):
+    """Fill the derived columns of a feature matrix in place (x / 0 gives 0)."""
+    # All ratios in one division, whatever their number
+    denominators = X[:, _RATIO_DENOMINATORS]
+    ratios = np.zeros_like(denominators)
+    np.divide(X[:, _RATIO_NUMERATORS], denominators, out=ratios, where=denominators != 0)
+    X[:, _RATIO_OUT] = ratios
+    return X
+
+
+def _encode_inputs(row):
+    return [row[name] if codes is None else codes[row[name]] for _, name, codes in _INPUT_COLUMNS]
+
+
+def encode_rows(rows, out=None):
+    """
+    Feature matrix for a list of dicts keyed by input name (validated request
+    payloads, PatientData.features()). `out` may be a preallocated matrix.
+    """
+    X = np.empty((len(rows), len(FEATURE_COLUMNS)), dtype=np.float64) if out is None else out
+    if len(rows) == 1:
+        # Single predictions: a few float divisions cost less than the NumPy
+        # calls of add_derived on a one-row matrix
+        values = _encode_inputs(rows[0])
+        values += [
+            values[numerator] / values[denominator] if values[denominator] else 0.0
+            for numerator, denominator in _RATIO_COLUMNS
+        ]
+        X[0] = values
+        return X
+
+    X[:, :len(INPUT_NAMES)] = [_encode_inputs(row) for row in rows]
+    return add_derived(X)
+
+
+def encode_columns(columns, n_rows):
+    """Feature matrix from column arrays keyed by input name (DataFrame, dict of sequences)."""
+    X = np.empty((n_rows, len(FEATURE_COLUMNS)), dtype=np.float64)
+    for col, name, codes in _INPUT_COLUMNS:
+        values = np.asarray(columns[name])
+        if codes is not None:
+            # Choices are sorted, so the code is the insertion point
+            values = np.searchsorted(np.array(list(codes)), values)
+        X[:, col] = values
+    return add_derived(X)
+
+
+def sample_input():
+    """A valid input dict (lowest bound / first choice / False), e.g. for warm-up."""
+    return {
+        f.name: f.options[0] if f.options is not None else False
+        for f in INPUT_FEATURES
+    }
@@ -0,0 +1,72 @@
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import PatientData
+
+
+def _parse_datetime(value, next_day=False):
+    """
+    Parse an ISO datetime, or a date taken as midnight (of the next day when
+    next_day is set), so that filters compare created_at directly and stay
+    on the index. Returns (datetime, was_a_plain_date).
+    """
+    parsed = parse_datetime(value)
+    is_date = parsed is None
+    if is_date:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        if next_day:
+            day += timedelta(days=1)
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed, is_date
+
+
+def filter_history(queryset, params):
+    """
+    Apply the history filters from query parameters:
+    diagnosis (comma separated), date_from / date_to (ISO date or datetime)
+    and age_min / age_max. Raises ValueError on malformed values.
+    """
+    diagnosis = params.get('diagnosis')
+    if diagnosis:
+        queryset = queryset.filter(diagnosis__in=diagnosis.split(','))
+    
+    date_from = params.get('date_from')
+    if date_from:
+        value, _ = _parse_datetime(date_from)
+        queryset = queryset.filter(created_at__gte=value)
+    
+    date_to = params.get('date_to')
+    if date_to:
+        # A plain date includes the whole day
+        value, is_date = _parse_datetime(date_to, next_day=True)
+        if is_date:
+            queryset = queryset.filter(created_at__lt=value)
+        else:
+            queryset = queryset.filter(created_at__lte=value)
+    
+    for param, lookup in (('age_min', 'age__gte'), ('age_max', 'age__lte')):
+        value = params.get(param)
+        if value:
+            try:
+                queryset = queryset.filter(**{lookup: int(value)})
+            except ValueError:
+                raise ValueError(f"Invalid {param}: {value}")
+    
+    return queryset
+
+
+def parse_fields(value):
+    """Validate a comma separated `fields=` projection against PatientData."""
+    if not value:
+        return None
+    
+    allowed = {field.name for field in PatientData._meta.concrete_fields}
+    fields = [name for name in value.split(',') if name]
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
@@ -0,0 +1,395 @@
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment
+from django.utils import timezone
+import numpy as np
+from medical_app.ml_model import get_model
+from medical_app.model_registry import ModelRegistry
+from medical_app.models import PatientData
+from medical_app.utils import generate_pdf, generate_prescription_image
+from medical_app.write_buffer import save_prediction
+
+SAMPLE_PATIENT = {
+    'age': 55,
+    'gender': 'M',
+    'glucose': 8.5,
+    'cholesterol': 4.5,
+    'triglycerides': 1.2,
+    'creatinine': 80,
+    'uree': 5.0,
+    'uric_acid': 300,
+    'got': 25,
+    'gpt': 25,
+    'bilirubin': 10,
+    'smoking': False,
+    'obesity': False,
+    'family_history': False,
+}
+
+
+def sample_patients(n, seed=0):
+    """
+    n patients around SAMPLE_PATIENT with varied labs. The prediction cache is
+    keyed on the encoded inputs, so each new one is a cache miss.
+    seed=None draws different patients on every call.
+    """
+    rng = np.random.RandomState(seed)
+    glucose = np.clip(rng.normal(5.5, 2.0, n), 0.5, 30).round(2)
+    cholesterol = np.clip(rng.normal(4.5, 1.0, n), 0.5, 15).round(2)
+    creatinine = np.clip(rng.normal(85, 25, n), 10, 1000).round(1)
+    got = np.clip(rng.normal(30, 12, n), 1, 500).round(1)
+    return [
+        dict(SAMPLE_PATIENT, glucose=float(g), cholesterol=float(c), creatinine=float(cr), got=float(t))
+        for g, c, cr, t in zip(glucose, cholesterol, creatinine, got)
+    ]
+
+# Libraries that must stay out of a freshly booted worker until a code path
+# (training, plotting, rendering) actually needs them
+HEAVY_MODULES = ('pandas', 'sklearn', 'scipy', 'matplotlib', 'joblib', 'reportlab', 'PIL')
+
+# Defaults of --startup-budget (seconds to the first prediction) and --rss-budget (MB)
+STARTUP_BUDGET_SECONDS = 1.5
+STARTUP_RSS_BUDGET_MB = 150
+
+# Run in a fresh interpreter: boot Django, import every view through the URLconf
+# and serve one prediction, the way a gunicorn worker would
+STARTUP_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+boot = time.perf_counter() - start
+from medical_app.ml_model import get_model
+get_model().predict(json.loads(sys.argv[1]))
+ready = time.perf_counter() - start
+try:
+    # ru_maxrss survives exec on Linux and would report the parent's peak
+    with open('/proc/self/status') as f:
+        rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmHWM:'))
+except OSError:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    'boot_seconds': boot,
+    'ready_seconds': ready,
+    'rss_bytes': rss,
+    'heavy_modules': [m for m in json.loads(sys.argv[2]) if m in sys.modules],
+}))
+"""
+
+
+def run_startup_probe(registry_root):
+    """
+    Boot a fresh interpreter on the models in registry_root and serve one
+    prediction (STARTUP_PROBE); returns its timings, peak RSS and the
+    HEAVY_MODULES it imported.
+    """
+    completed = subprocess.run(
+        [sys.executable, '-c', STARTUP_PROBE, json.dumps(SAMPLE_PATIENT), json.dumps(HEAVY_MODULES)],
+        cwd=settings.BASE_DIR, env=dict(os.environ, MODEL_REGISTRY_DIR=str(registry_root)),
+        capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Startup probe failed:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples, rows=1):
+    """Latency percentiles (microseconds) and throughput for a list of durations in seconds."""
+    us = np.asarray(samples) * 1e6
+    return {
+        'iterations': len(samples),
+        'mean_us': float(us.mean()),
+        'min_us': float(us.min()),
+        'p50_us': float(np.percentile(us, 50)),
+        'p95_us': float(np.percentile(us, 95)),
+        'p99_us': float(np.percentile(us, 99)),
+        'rows_per_sec': float(rows * len(samples) / sum(samples)),
+    }
+
+
+WARMUP = 5
+ALLOC_ITERATIONS = 20
+
+
+def measure(func, iterations, warmup=WARMUP, rows=1, alloc_iterations=ALLOC_ITERATIONS):
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    result = summarize(samples, rows)
+
+    # Allocations on a separate pass: tracing skews the timings
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for _ in range(alloc_iterations):
+            func()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    diff = after.compare_to(before, 'filename')
+    result['alloc_peak_bytes'] = peak
+    result['alloc_net_bytes_per_call'] = sum(stat.size_diff for stat in diff) / alloc_iterations
+    return result
+
+
+class Command(BaseCommand):
+    help = "Benchmark the prediction and prescription rendering paths"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', default='all',
+                            help="Comma separated: predict_single, predict_cached, predict_batch, api_predict, "
+                                 "render_pdf, render_png, startup, concurrent_writes")
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--batch-sizes', default='1,10,100,1000,10000')
+        parser.add_argument('--output', help="Write JSON results to this file")
+        parser.add_argument('--compare', help="Baseline JSON file to compare against")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Allowed p50/p95 slowdown vs the baseline (0.2 = 20%%)")
+        parser.add_argument('--startup-budget', type=float, default=STARTUP_BUDGET_SECONDS,
+                            help="startup: maximum seconds from interpreter start to first prediction")
+        parser.add_argument('--writers', type=int, default=16,
+                            help="Concurrent threads in the concurrent_writes scenario")
+        parser.add_argument('--rss-budget', type=float, default=STARTUP_RSS_BUDGET_MB,
+                            help="startup: maximum resident memory (MB) after the first prediction")
+
+    def handle(self, *args, **options):
+        scenarios = {
+            'predict_single': self.bench_predict_single,
+            'predict_cached': self.bench_predict_cached,
+            'predict_batch': self.bench_predict_batch,
+            'api_predict': self.bench_api_predict,
+            'render_pdf': self.bench_render_pdf,
+            'render_png': self.bench_render_png,
+            'startup': self.bench_startup,
+            'concurrent_writes': self.bench_concurrent_writes,
+        }
+        selected = list(scenarios) if options['scenarios'] == 'all' else options['scenarios'].split(',')
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        self.options = options
+        self.model = get_model()
+        self._ensure_model()
+
+        results = {}
+        for name in selected:
+            for key, result in scenarios[name]():
+                results[key] = result
+                self.stdout.write(
+                    f"{key:<24} p50 {result['p50_us']:>10.1f} us  p95 {result['p95_us']:>10.1f} us  "
+                    f"p99 {result['p99_us']:>10.1f} us  {result['rows_per_sec']:>12.0f} rows/s  "
+                    f"peak {result.get('alloc_peak_bytes', 0) / 1024:>8.1f} KiB"
+                )
+
+        report = {'meta': self._meta(), 'results': results}
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['compare']:
+            self._compare(report, options['compare'], options['threshold'])
+
+    def _ensure_model(self):
+        if self.model.ensure_current():
+            return
+        # No published model: train a throwaway one outside the real registry
+        self.stdout.write("No trained model found, training a temporary one...")
+        self.model.registry = ModelRegistry(tempfile.mkdtemp(prefix='benchmark-model-'))
+        self.model._pointer_stamp = None
+        self.model.train_model()
+
+    def _meta(self):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'model_version': self.model.version,
+        }
+
+    def _new_patients(self):
+        """Endless supply of patients, none of them in the prediction cache yet."""
+        self.model.prediction_cache.clear()
+        return itertools.cycle(sample_patients(self.options['iterations'] + WARMUP + ALLOC_ITERATIONS))
+
+    def bench_predict_single(self):
+        patients = self._new_patients()
+        yield 'predict_single', measure(
+            lambda: self.model.predict(next(patients)),
+            self.options['iterations']
+        )
+
+    def bench_predict_cached(self):
+        # The same patient every time: after the warmup, each call is a cache hit
+        yield 'predict_cached', measure(
+            lambda: self.model.predict(SAMPLE_PATIENT),
+            self.options['iterations']
+        )
+
+    def bench_predict_batch(self):
+        rng = np.random.RandomState(0)
+        for size in [int(n) for n in self.options['batch_sizes'].split(',')]:
+            patients = [
+                dict(SAMPLE_PATIENT, glucose=float(g), cholesterol=float(c))
+                for g, c in zip(rng.normal(5.5, 2.0, size), rng.normal(4.5, 1.0, size))
+            ]
+            iterations = max(5, min(self.options['iterations'], 100000 // size))
+            yield f'predict_batch_{size}', measure(
+                lambda: self.model.predict_batch(patients),
+                iterations, warmup=2, rows=size, alloc_iterations=min(5, iterations)
+            )
+
+    def bench_api_predict(self):
+        setup_test_environment()
+        client = Client()
+        patients = self._new_patients()
+
+        def post():
+            response = client.post('/api/predict/', next(patients), content_type='application/json')
+            if response.status_code != 200:
+                raise CommandError(f"/api/predict/ returned {response.status_code}: {response.content[:200]}")
+
+        # Real INSERTs, rolled back at the end
+        with transaction.atomic():
+            result = measure(post, self.options['iterations'])
+            transaction.set_rollback(True)
+        yield 'api_predict', result
+
+    def _sample_row(self):
+        return PatientData(id=1, diagnosis='DIABETE', prediction_made=True, created_at=timezone.now(), **SAMPLE_PATIENT)
+
+    def bench_render_pdf(self):
+        patient = self._sample_row()
+        yield 'render_pdf', measure(
+            lambda: generate_pdf(patient),
+            min(self.options['iterations'], 50), alloc_iterations=5
+        )
+
+    def bench_render_png(self):
+        patient = self._sample_row()
+        yield 'render_png', measure(
+            lambda: generate_prescription_image(patient),
+            min(self.options['iterations'], 50), alloc_iterations=5
+        )
+
+    def bench_startup(self):
+        samples, runs = [], []
+        for _ in range(5):
+            try:
+                run = run_startup_probe(self.model.registry.root)
+            except RuntimeError as e:
+                raise CommandError(str(e))
+            samples.append(run['ready_seconds'])
+            runs.append(run)
+
+        result = summarize(samples)
+        result['boot_p50_us'] = float(np.percentile([run['boot_seconds'] for run in runs], 50) * 1e6)
+        result['alloc_peak_bytes'] = max(run['rss_bytes'] for run in runs)
+        result['heavy_modules'] = runs[-1]['heavy_modules']
+
+        breaches = []
+        if result['p50_us'] > self.options['startup_budget'] * 1e6:
+            breaches.append(f"ready in {result['p50_us'] / 1e6:.2f}s > {self.options['startup_budget']}s")
+        if result['alloc_peak_bytes'] > self.options['rss_budget'] * 1024 * 1024:
+            breaches.append(f"RSS {result['alloc_peak_bytes'] / 2**20:.0f} MB > {self.options['rss_budget']} MB")
+        if result['heavy_modules']:
+            breaches.append(f"imported at startup: {', '.join(result['heavy_modules'])}")
+        if breaches:
+            raise CommandError(f"Startup budget exceeded: {'; '.join(breaches)}")
+        yield 'startup', result
+
+    def bench_concurrent_writes(self):
+        """Prediction rows saved from --writers threads: one commit each, then through the write buffer."""
+        fields = dict(
+            SAMPLE_PATIENT,
+            diagnosis='DIABETE',
+            probabilities={'DIABETE': 1.0},
+            model_version=self.model.version,
+            inference_ms=0.0,
+            prediction_made=True
+        )
+        per_writer = max(10, self.options['iterations'] // 4)
+
+        for name, buffered in (('writes_direct', False), ('writes_buffered', True)):
+            samples, ids = [], []
+            lock = threading.Lock()
+
+            def writer():
+                try:
+                    for _ in range(per_writer):
+                        start = time.perf_counter()
+                        patient = save_prediction(**fields)
+                        elapsed = time.perf_counter() - start
+                        with lock:
+                            samples.append(elapsed)
+                            ids.append(patient.id)
+                finally:
+                    connection.close()
+
+            with override_settings(PREDICTION_WRITE_BUFFER=buffered):
+                threads = [threading.Thread(target=writer) for _ in range(self.options['writers'])]
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                wall = time.perf_counter() - start
+
+            # Real commits: delete the rows afterwards
+            PatientData.objects.filter(id__in=ids).delete()
+            if len(ids) != per_writer * len(threads):
+                raise CommandError(f"{name}: {per_writer * len(threads) - len(ids)} writes failed")
+
+            result = summarize(samples)
+            # Throughput over wall time, not the sum of the overlapping latencies
+            result['rows_per_sec'] = len(samples) / wall
+            yield name, result
+
+    def _compare(self, report, baseline_path, threshold):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+        regressions = []
+        for name, result in report['results'].items():
+            old = baseline.get('results', {}).get(name)
+            if old is None:
+                continue
+            for metric in ('p50_us', 'p95_us'):
+                ratio = result[metric] / old[metric] if old[metric] else 1.0
+                marker = ''
+                if ratio > 1 + threshold:
+                    marker = '  REGRESSION'
+                    regressions.append(f"{name}.{metric}")
+                self.stdout.write(f"{name:<24} {metric:<7} {old[metric]:>10.1f} -> {result[metric]:>10.1f} us ({ratio:5.2f}x){marker}")
+
+        if regressions:
+            raise CommandError(f"Performance regressions: {', '.join(regressions)}")
@@ -0,0 +1,85 @@
+import os
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from medical_app.features import INPUT_FEATURES, INPUT_NAMES, sample_input
+from medical_app.ml_model import get_model
+from medical_app.portable_runtime import PortableModel
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the current decision tree for medical_app/portable_runtime.py, "
+        "then check that the runtime's predictions match the server's"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output .json file")
+        parser.add_argument('--check-samples', type=int, default=5000,
+                            help="Synthetic patients in the parity check (0 to skip it)")
+
+    def handle(self, *args, **options):
+        model = get_model()
+        try:
+            version = model.export_portable(options['path'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        start = time.perf_counter()
+        portable = PortableModel.load(options['path'])
+        load_ms = (time.perf_counter() - start) * 1000
+        self.stdout.write(
+            f"Exported model {version} to {options['path']} "
+            f"({os.path.getsize(options['path']) / 1024:.1f} KB, loads in {load_ms:.1f} ms)"
+        )
+
+        if options['check_samples'] > 0:
+            patients = self._parity_patients(model, options['check_samples'])
+            mismatches = self._check_parity(model, portable, patients)
+            if mismatches:
+                raise CommandError(
+                    f"{len(mismatches)} of {len(patients)} predictions differ, e.g. {mismatches[0]}"
+                )
+            self.stdout.write(self.style.SUCCESS(f"Parity check passed on {len(patients)} patients"))
+
+    def _parity_patients(self, model, n_samples):
+        """Synthetic patients plus edge cases: every split threshold, zero denominators, every choice."""
+        df = model.generate_sample_data(n_samples, seed=7)
+        patients = [
+            {name: row[name] for name in INPUT_NAMES}
+            for row in df[INPUT_NAMES].to_dict('records')
+        ]
+
+        base = sample_input()
+        numeric = {f.name for f in INPUT_FEATURES if f.kind in ('int', 'float')}
+        tree = model.flat_tree
+        for node in np.flatnonzero(tree.left != np.arange(len(tree.left))):
+            name = model.feature_names[tree.feature[node]]
+            if name not in numeric:
+                continue
+            # Exactly on the threshold and one float32 step either side of it
+            threshold = np.float32(tree.threshold[node])
+            for value in (np.nextafter(threshold, np.float32(-np.inf)), threshold, np.nextafter(threshold, np.float32(np.inf))):
+                for patient in (base, patients[node % len(patients)]):
+                    patients.append(dict(patient, **{name: float(value)}))
+
+        for feature in INPUT_FEATURES:
+            if feature.kind == 'choice':
+                patients.extend(dict(base, **{feature.name: choice}) for choice in feature.options)
+        patients.append(dict(base, gpt=0.0, uree=0.0))
+        patients.append(dict(base, got=0.0, gpt=0.0, creatinine=0.0, uree=0.0))
+        return patients
+
+    def _check_parity(self, model, portable, patients):
+        mismatches = []
+        batch = portable.predict_batch(patients)
+        for patient, batch_result in zip(patients, batch):
+            expected = model.predict(patient)
+            single_result = portable.predict(patient)
+            if single_result != expected or batch_result != expected:
+                mismatches.append({'patient': patient, 'expected': expected, 'portable': single_result})
+
+        expected_batch = model.predict_batch(patients)
+        if [tuple(result) for result in expected_batch] != [tuple(result) for result in batch]:
+            mismatches.append({'patient': 'predict_batch', 'expected': 'server batch', 'portable': 'runtime batch'})
+        return mismatches
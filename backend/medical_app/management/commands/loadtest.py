@@ -0,0 +1,222 @@
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from medical_app.management.commands.benchmark import SAMPLE_PATIENT, sample_patients, summarize
+from medical_app.models import PatientData
+
+# Paths relative to each target's API root: /api/ (sync) or /api/async/.
+# predict posts a different new patient each time, so the server's prediction
+# cache never answers; predict_cached posts the same one. Cold scenarios request
+# a different new patient each time, so every document is rendered instead of
+# read from the prescription cache.
+SCENARIOS = {
+    'predict': ('POST', 'predict/'),
+    'predict_cached': ('POST', 'predict/'),
+    'result_detail': ('GET', 'results/{id}/'),
+    'prescription_pdf': ('GET', 'prescription/{id}/'),
+    'prescription_png': ('GET', 'prescription-image/{id}/'),
+    'prescription_pdf_cold': ('GET', 'prescription/{id}/'),
+    'prescription_png_cold': ('GET', 'prescription-image/{id}/'),
+}
+# Every POST /predict/ saves a PatientData row on the target
+WRITE_SCENARIOS = {'predict', 'predict_cached', 'prescription_pdf_cold', 'prescription_png_cold'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test running servers with concurrent clients and compare them, e.g. "
+        "sync=http://127.0.0.1:8000/api/ async=http://127.0.0.1:8001/api/async/"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('targets', nargs='+', help="name=API root URL")
+        parser.add_argument('--scenarios', default='all',
+                            help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=500, help="Requests per scenario and target")
+        parser.add_argument('--output', help="Write JSON results to this file")
+        parser.add_argument('--allow-writes', action='store_true',
+                            help="Allow scenarios that save prediction rows on the targets "
+                                 "(predict, predict_cached, the _cold ones, and the GET scenarios without --patient-id)")
+        parser.add_argument('--patient-id', type=int,
+                            help="Existing patient for the GET scenarios, instead of creating one per target")
+        parser.add_argument('--keep-rows', action='store_true',
+                            help="Do not delete the rows created by the run")
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['targets']:
+            name, sep, url = target.partition('=')
+            if not sep or not url.startswith('http'):
+                raise CommandError(f"Expected name=URL, got {target!r}")
+            targets.append((name, url if url.endswith('/') else url + '/'))
+
+        names = list(SCENARIOS) if options['scenarios'] == 'all' else options['scenarios'].split(',')
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        writes = sorted(set(names) & WRITE_SCENARIOS)
+        if options['patient_id'] is None and set(names) - WRITE_SCENARIOS:
+            writes.append('a patient for the GET scenarios (or pass --patient-id)')
+        if writes and not options['allow_writes']:
+            raise CommandError(
+                f"These save prediction rows on the targets: {', '.join(writes)}. "
+                f"Pass --allow-writes, or choose read-only scenarios with --patient-id."
+            )
+
+        # (id, created_at) of every row the run creates, deleted at the end
+        self._created = []
+        self._created_lock = threading.Lock()
+        try:
+            report = self._run_scenarios(targets, names, options)
+        finally:
+            if self._created and not options['keep_rows']:
+                self._delete_created()
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _run_scenarios(self, targets, names, options):
+        report = {'concurrency': options['concurrency'], 'results': {}}
+        for target, root in targets:
+            # Patients of this target's own for the GET scenarios
+            patient_id = options['patient_id']
+            if patient_id is None and set(names) - WRITE_SCENARIOS:
+                patient_id = self._create_patient(target, root)
+
+            for name in names:
+                method, path = SCENARIOS[name]
+                if name.endswith('_cold'):
+                    ids = [self._create_patient(target, root) for _ in range(options['requests'])]
+                else:
+                    ids = [patient_id]
+                paths = [path.format(id=id) for id in ids]
+                if name == 'predict':
+                    # Not seeded: a rerun against the same servers must miss their cache too
+                    bodies = sample_patients(options['requests'], seed=None)
+                else:
+                    bodies = [SAMPLE_PATIENT]
+                result = self._run(root, method, paths, bodies, options['concurrency'], options['requests'])
+                report['results'][f'{target}.{name}'] = result
+                self.stdout.write(
+                    f"{target:<8} {name:<18} {result['rows_per_sec']:>8.1f} req/s  "
+                    f"p50 {result['p50_us'] / 1000:>7.1f} ms  p95 {result['p95_us'] / 1000:>7.1f} ms  "
+                    f"errors {result['errors']}"
+                )
+
+        if len(targets) > 1:
+            self._compare(report['results'], [target for target, _ in targets], names)
+        return report
+
+    def _create_patient(self, target, root):
+        status, body = self._request(root, 'POST', 'predict/', SAMPLE_PATIENT)
+        if status != 200:
+            raise CommandError(f"{target}: predict returned {status}: {body[:200]}")
+        return self._record_created(body)
+
+    def _record_created(self, body):
+        data = json.loads(body)
+        with self._created_lock:
+            self._created.append((data['id'], parse_datetime(data['created_at'])))
+        return data['id']
+
+    def _delete_created(self):
+        """
+        Delete the rows the run created from this command's database. A row is
+        only deleted if its id and created_at both match what the target
+        returned, so a different database than the targets' is left alone.
+        """
+        created = dict(self._created)
+        ids = list(created)
+        matching = []
+        for start in range(0, len(ids), 500):
+            rows = PatientData.objects.filter(id__in=ids[start:start + 500]).values_list('id', 'created_at')
+            matching.extend(id for id, created_at in rows if created_at == created[id])
+        for start in range(0, len(matching), 500):
+            PatientData.objects.filter(id__in=matching[start:start + 500]).delete()
+
+        self.stdout.write(f"Deleted {len(matching)} of the {len(ids)} patients created by the load test")
+        if len(matching) < len(ids):
+            self.stdout.write(self.style.WARNING(
+                f"{len(ids) - len(matching)} were saved in a database this command does not use; "
+                f"they remain on the targets"
+            ))
+
+    def _request(self, root, method, path, body=None):
+        url = urlsplit(root + path)
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        # One connection per request: sync gunicorn workers do not keep connections alive
+        connection = connection_class(url.netloc, timeout=60)
+        try:
+            if method == 'POST':
+                connection.request(method, url.path, json.dumps(body), {'Content-Type': 'application/json'})
+            else:
+                connection.request(method, url.path)
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+    def _run(self, root, method, paths, bodies, concurrency, n_requests):
+        """
+        Send n_requests (cycling through paths, and bodies for POSTs) from
+        `concurrency` client threads; latency percentiles and throughput.
+        """
+        latencies = []
+        errors = []
+        remaining = [n_requests]
+        lock = threading.Lock()
+
+        def client():
+            while True:
+                with lock:
+                    if remaining[0] == 0:
+                        return
+                    remaining[0] -= 1
+                    path = paths[remaining[0] % len(paths)]
+                    body = bodies[remaining[0] % len(bodies)]
+                start = time.perf_counter()
+                try:
+                    status, response_body = self._request(root, method, path, body)
+                except OSError as e:
+                    status = repr(e)
+                elapsed = time.perf_counter() - start
+                if method == 'POST' and status == 200:
+                    self._record_created(response_body)
+                with lock:
+                    latencies.append(elapsed)
+                    if status != 200:
+                        errors.append(status)
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+
+        result = summarize(latencies)
+        # Throughput over wall time, not the sum of the overlapping latencies
+        result['rows_per_sec'] = len(latencies) / wall
+        result['errors'] = len(errors)
+        return result
+
+    def _compare(self, results, targets, names):
+        baseline = targets[0]
+        for target in targets[1:]:
+            for name in names:
+                old = results[f'{baseline}.{name}']
+                new = results[f'{target}.{name}']
+                self.stdout.write(
+                    f"{name:<18} {target} vs {baseline}: "
+                    f"{new['rows_per_sec'] / old['rows_per_sec']:5.2f}x throughput, "
+                    f"p95 {old['p95_us'] / 1000:.1f} -> {new['p95_us'] / 1000:.1f} ms"
+                )
@@ -0,0 +1,161 @@
+"""
+In-process metrics for the hot paths, exposed in Prometheus text format.
+
+Timings use time.perf_counter (monotonic). Every gunicorn worker keeps its own
+counters, so each scrape of /api/metrics/ describes the worker that answered it.
+"""
+import bisect
+import threading
+import time
+
+# Histogram bucket upper bounds in seconds, from 10 us to 10 s
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Span:
+    __slots__ = ('registry', 'name', 'labels', 'start')
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join(f'{name}="{str(value)}"' for name, value in pairs)
+    return '{' + body + '}'
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._help = {}
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def span(self, name, **labels):
+        """Time a block: `with metrics.span('diagnosis_stage_seconds', stage='encode'):`"""
+        return _Span(self, name, labels)
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def register_gauge(self, name, func):
+        """func() returns a list of (labels dict, value), evaluated at scrape time."""
+        self._gauges[name] = func
+
+    def counter_value(self, name, **labels):
+        return self._counters.get((name, _label_key(labels)), 0)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        seen = set()
+
+        def header(name, kind):
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f'# HELP {name} {self._help[name]}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, key), value in counters:
+            header(name, 'counter')
+            lines.append(f'{name}{_format_labels(key)} {value}')
+
+        for (name, key), histogram in histograms:
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(key, [("le", repr(bound))])} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(key, [("le", "+Inf")])} {histogram.count}')
+            lines.append(f'{name}_sum{_format_labels(key)} {histogram.sum}')
+            lines.append(f'{name}_count{_format_labels(key)} {histogram.count}')
+
+        for name, func in sorted(self._gauges.items()):
+            header(name, 'gauge')
+            for labels, value in func():
+                lines.append(f'{name}{_format_labels(_label_key(labels))} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+metrics.describe('diagnosis_stage_seconds', 'Time spent in each stage of the prediction path.')
+metrics.describe('diagnosis_requests_total', 'HTTP requests by view and status code.')
+metrics.describe('diagnosis_request_seconds', 'HTTP request latency by view.')
+metrics.describe('diagnosis_cache_requests_total', 'Cache lookups by cache and result (hit/miss).')
+metrics.describe('diagnosis_cache_hit_ratio', 'Share of cache lookups that were hits.')
+metrics.describe('diagnosis_model_info', 'Model version served by this worker (1 when loaded).')
+
+
+def _cache_hit_ratios():
+    caches = {
+        dict(key)['cache']
+        for name, key in list(metrics._counters)
+        if name == 'diagnosis_cache_requests_total'
+    }
+    ratios = []
+    for cache in sorted(caches):
+        hits = metrics.counter_value('diagnosis_cache_requests_total', cache=cache, result='hit')
+        misses = metrics.counter_value('diagnosis_cache_requests_total', cache=cache, result='miss')
+        if hits + misses:
+            ratios.append(({'cache': cache}, hits / (hits + misses)))
+    return ratios
+
+
+metrics.register_gauge('diagnosis_cache_hit_ratio', _cache_hit_ratios)
+
+
+def record_cache(cache, hit):
+    metrics.inc('diagnosis_cache_requests_total', cache=cache, result='hit' if hit else 'miss')
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_app', '0002_trainingjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patientdata',
+            index=models.Index(condition=models.Q(('prediction_made', True)), fields=['-created_at', '-id', 'diagnosis', 'age', 'gender'], name='patient_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patientdata',
+            index=models.Index(condition=models.Q(('prediction_made', True)), fields=['diagnosis', '-created_at', '-id', 'age', 'gender'], name='patient_history_diag_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patientdata',
+            index=models.Index(condition=models.Q(('prediction_made', True)), fields=['age', '-created_at'], name='patient_history_age_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_app', '0003_history_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patientdata',
+            name='inference_ms',
+            field=models.FloatField(blank=True, help_text='Model inference time (ms)', null=True),
+        ),
+        migrations.AddField(
+            model_name='patientdata',
+            name='model_version',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='patientdata',
+            name='probabilities',
+            field=models.JSONField(blank=True, help_text='Class probabilities {diagnosis: p}', null=True),
+        ),
+    ]
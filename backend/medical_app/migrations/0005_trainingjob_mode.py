@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_app', '0004_prediction_details'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingjob',
+            name='mode',
+            field=models.CharField(choices=[('quick', 'Arbre de décision fixe'), ('search', "Recherche d'hyperparamètres (validation croisée)")], default='quick', max_length=10),
+        ),
+    ]
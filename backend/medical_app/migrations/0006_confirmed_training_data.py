@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_app', '0005_trainingjob_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patientdata',
+            name='confirmed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='patientdata',
+            name='diagnosis_confirmed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='trainingjob',
+            name='source',
+            field=models.CharField(choices=[('synthetic', 'Données synthétiques'), ('database', 'Cas confirmés')], default='synthetic', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='patientdata',
+            index=models.Index(condition=models.Q(('diagnosis_confirmed', True)), fields=['confirmed_at', 'id'], name='patient_confirmed_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_app', '0006_confirmed_training_data'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='patientdata',
+            name='patient_history_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='patientdata',
+            name='patient_history_diag_idx',
+        ),
+        migrations.AddIndex(
+            model_name='patientdata',
+            index=models.Index(condition=models.Q(('prediction_made', True)), fields=['-created_at', '-id', 'diagnosis', 'age', 'gender', 'prediction_made'], name='patient_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patientdata',
+            index=models.Index(condition=models.Q(('prediction_made', True)), fields=['diagnosis', '-created_at', '-id', 'age', 'gender', 'prediction_made'], name='patient_history_diag_idx'),
+        ),
+    ]
@@ -1,171 +1,593 @@
-import pandas as pd
+"""
+Diagnosis model: synthetic data, training, and the prediction fast path.
+
+Only NumPy is imported at module level. pandas, scikit-learn, matplotlib and
+joblib are imported inside the code paths that need them (training, plotting,
+legacy loading), so importing the views does not pay for them.
+"""
 import numpy as np
-from sklearn.tree import DecisionTreeClassifier, plot_tree
-from sklearn.preprocessing import LabelEncoder
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
-import matplotlib
-matplotlib.use('Agg')  # Use non-GUI backend to prevent macOS crash
-import matplotlib.pyplot as plt
 from io import BytesIO
 import base64
-import joblib
+import json
 import os
+import tempfile
+import threading
+from collections import namedtuple
 from django.conf import settings
+from .metrics import metrics, record_cache
+from .model_registry import get_registry
+from .features import (
+    DERIVED_FEATURES, FEATURE_COLUMNS, COLUMN_INDEX, GENDER_CLASSES, INPUT_FEATURES,
+    encode_columns, encode_rows, sample_input,
+)
+from .prediction_cache import PredictionCache
+from .tree_engine import FlatTree, compile_tree
+from .tree_rules import TreeExplainer
+
+# Diagnosis rules for the synthetic data, checked in order: a row gets the
+# first diagnosis with any analysis above its limit.
+DIAGNOSIS_RULES = [
+    ('DIABETE', [('glucose', 7.0)]),
+    ('HYPERLIPIDEMIE', [('cholesterol', 6.2), ('triglycerides', 2.3)]),
+    ('RENAL', [('creatinine', 130), ('uree', 9.0)]),
+    ('HEPATIQUE', [('got', 50), ('gpt', 50), ('bilirubin', 25)]),
+]
+DEFAULT_DIAGNOSIS = 'SAIN'
+
+TREE_IMAGE_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+_plot_lock = threading.Lock()
+
+STAGE_METRIC = 'diagnosis_stage_seconds'
+
+# quick: one fixed decision tree; search: cross-validated search (model_search)
+TRAINING_MODES = ('quick', 'search')
+# The quick mode's tree, also the baseline the search has to beat
+QUICK_TREE_PARAMS = {'criterion': 'entropy', 'max_depth': 8, 'min_samples_split': 5}
+# synthetic: generate_sample_data(); database: confirmed PatientData (training_data)
+TRAINING_SOURCES = ('synthetic', 'database')
+
+# Everything a prediction reads for one model version. A (re)load builds a new
+# one and swaps it in with a single assignment, and the prediction paths read
+# it once per call, so a concurrent reload never mixes two versions' tables.
+# predictor: what predictions run on, the flat tree or the sklearn estimator
+# for models without a flat export (random forest, gradient boosting);
+# model_columns: schema columns the model was trained on, in its order, or None
+# when it uses the full current schema (models trained before a feature was
+# added see only their subset); explainer: split descriptions for decision
+# paths and rules (single trees only).
+ServingState = namedtuple('ServingState', [
+    'version', 'predictor', 'flat_tree', 'feature_names', 'class_table', 'model_columns', 'explainer',
+])
+
+def _serving_state(version, predictor, flat_tree, feature_names, class_table):
+    """Precompute the per-model tables used by the prediction fast path."""
+    feature_names = list(feature_names)
+    # Class index (column of predict_proba) -> diagnosis name
+    class_table = [str(name) for name in class_table]
+    columns = [COLUMN_INDEX[name] for name in feature_names]
+    model_columns = None if columns == list(range(len(FEATURE_COLUMNS))) else np.array(columns)
+    explainer = TreeExplainer(flat_tree, feature_names, class_table) if flat_tree is not None else None
+    return ServingState(version, predictor, flat_tree, feature_names, class_table, model_columns, explainer)
 
 class MedicalDiagnosisModel:
     def __init__(self):
-        self.model = None
+        self._state = None
+        # (version, fitted sklearn estimator), unpickled on demand
+        self._estimator = None
+        self.registry = get_registry()
+        self._pointer_stamp = None
+        self._reload_lock = threading.Lock()
+        self.prediction_cache = PredictionCache(
+            getattr(settings, 'PREDICTION_CACHE_SIZE', 10000),
+            getattr(settings, 'PREDICTION_CACHE_TTL', 3600)
+        )
+        self._row_buffers = threading.local()
         self.label_encoders = {}
-        self.feature_names = []
         self.class_names = ['SAIN', 'DIABETE', 'HYPERLIPIDEMIE', 'RENAL', 'HEPATIQUE']
         
-    def generate_sample_data(self):
-        np.random.seed(42)
-        n_samples = 1000
+    # Read-only views of the serving state for callers outside the prediction
+    # paths; each is a separate read, so they may straddle a reload
+    @property
+    def version(self):
+        state = self._state
+        return state.version if state is not None else None
+    
+    @property
+    def predictor(self):
+        state = self._state
+        return state.predictor if state is not None else None
+    
+    @property
+    def flat_tree(self):
+        state = self._state
+        return state.flat_tree if state is not None else None
+    
+    @property
+    def feature_names(self):
+        state = self._state
+        return state.feature_names if state is not None else []
+    
+    def _swap_state(self, state, estimator=None):
+        if estimator is not None:
+            self._estimator = (state.version, estimator)
+        self._state = state
+    
+    def generate_sample_data(self, n_samples=1000, seed=42, rules=None):
+        rng = np.random.RandomState(seed)
+        return self._generate_chunk(rng, n_samples, rules)
+    
+    def iter_sample_data(self, n_samples, chunk_size=100000, seed=42, rules=None):
+        """Yield synthetic data as DataFrames of at most chunk_size rows."""
+        rng = np.random.RandomState(seed)
+        remaining = n_samples
+        while remaining > 0:
+            size = min(chunk_size, remaining)
+            yield self._generate_chunk(rng, size, rules)
+            remaining -= size
+    
+    def export_sample_data(self, path, n_samples, chunk_size=100000, seed=42, rules=None):
+        """
+        Stream synthetic data to a .csv or .parquet file chunk by chunk.
+        Returns the number of rows written.
+        """
+        chunks = self.iter_sample_data(n_samples, chunk_size, seed, rules)
+        written = 0
+        
+        if str(path).endswith('.parquet'):
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("Parquet export requires the 'pyarrow' package")
+            
+            writer = None
+            try:
+                for chunk in chunks:
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(path, table.schema)
+                    writer.write_table(table)
+                    written += len(chunk)
+            finally:
+                if writer is not None:
+                    writer.close()
+        else:
+            with open(path, 'w', newline='') as f:
+                for chunk in chunks:
+                    chunk.to_csv(f, header=written == 0, index=False)
+                    written += len(chunk)
         
+        return written
+    
+    def _generate_chunk(self, rng, n_samples, rules=None):
         # Generate realistic lab data
         data = {
-            'age': np.random.randint(18, 90, n_samples),
-            'gender': np.random.choice(['M', 'F'], n_samples),
+            'age': rng.randint(18, 90, n_samples),
+            'gender': rng.choice(['M', 'F'], n_samples),
             
             # Metabolic
-            'glucose': np.random.normal(5.0, 1.5, n_samples),  # Normal 3.9-6.4
-            'cholesterol': np.random.normal(4.5, 1.0, n_samples), # Normal 3.6-6.0
-            'triglycerides': np.random.normal(1.2, 0.5, n_samples), # Normal 0.0-1.9
+            'glucose': rng.normal(5.0, 1.5, n_samples),  # Normal 3.9-6.4
+            'cholesterol': rng.normal(4.5, 1.0, n_samples), # Normal 3.6-6.0
+            'triglycerides': rng.normal(1.2, 0.5, n_samples), # Normal 0.0-1.9
             
             # Kidney
-            'creatinine': np.random.normal(80, 20, n_samples), # Normal 50-120
-            'uree': np.random.normal(5.0, 1.5, n_samples), # Normal 3.5-8.5
-            'uric_acid': np.random.normal(300, 80, n_samples), # Normal 208-428
+            'creatinine': rng.normal(80, 20, n_samples), # Normal 50-120
+            'uree': rng.normal(5.0, 1.5, n_samples), # Normal 3.5-8.5
+            'uric_acid': rng.normal(300, 80, n_samples), # Normal 208-428
             
             # Liver
-            'got': np.random.normal(25, 10, n_samples), # Normal 0-40
-            'gpt': np.random.normal(25, 10, n_samples), # Normal 0-40
-            'bilirubin': np.random.normal(10, 5, n_samples), # Normal 2.0-21.0
+            'got': rng.normal(25, 10, n_samples), # Normal 0-40
+            'gpt': rng.normal(25, 10, n_samples), # Normal 0-40
+            'bilirubin': rng.normal(10, 5, n_samples), # Normal 2.0-21.0
         }
         
+        # Risk factors, drawn after the labs so the base lab values stay the
+        # same for a given seed, and shifting the analyses they affect
+        smoking = rng.rand(n_samples) < 0.25
+        obesity = rng.rand(n_samples) < 0.20
+        family_history = rng.rand(n_samples) < 0.15
+        data['glucose'] += 1.0 * obesity + 0.8 * family_history
+        data['cholesterol'] += 0.5 * smoking + 0.4 * obesity
+        data['triglycerides'] += 0.4 * obesity
+        
         # Ensure no negative values
         for key in data:
             if key != 'gender':
                 data[key] = np.abs(data[key])
         
-        df = pd.DataFrame(data)
+        data['smoking'] = smoking
+        data['obesity'] = obesity
+        data['family_history'] = family_history
         
-        diagnoses = []
-        for idx, row in df.iterrows():
-            # Diagnosis Rules
-            if row['glucose'] > 7.0:
-                diagnoses.append('DIABETE')
-            elif row['cholesterol'] > 6.2 or row['triglycerides'] > 2.3:
-                diagnoses.append('HYPERLIPIDEMIE')
-            elif row['creatinine'] > 130 or row['uree'] > 9.0:
-                diagnoses.append('RENAL')
-            elif row['got'] > 50 or row['gpt'] > 50 or row['bilirubin'] > 25:
-                diagnoses.append('HEPATIQUE')
-            else:
-                diagnoses.append('SAIN')
-                
-        df['diagnosis'] = diagnoses
+        import pandas as pd
+        
+        df = pd.DataFrame(data)
+        df['diagnosis'] = self.label_data(data, rules)
         return df
     
+    def label_data(self, data, rules=None):
+        """Apply the diagnosis rules to whole columns at once."""
+        if rules is None:
+            rules = DIAGNOSIS_RULES
+        
+        conditions = []
+        for _, checks in rules:
+            mask = np.zeros(len(data['age']), dtype=bool)
+            for feature, limit in checks:
+                mask |= np.asarray(data[feature]) > limit
+            conditions.append(mask)
+        
+        return np.select(
+            conditions,
+            [diagnosis for diagnosis, _ in rules],
+            default=DEFAULT_DIAGNOSIS
+        )
+    
     def preprocess_data(self, df):
-        df_encoded = df.copy()
-        # Encode gender
-        le_gender = LabelEncoder()
-        df_encoded['gender'] = le_gender.fit_transform(df['gender'])
-        self.label_encoders['gender'] = le_gender
+        """Encode a DataFrame with a diagnosis column into (X, y) following the feature schema."""
+        return self._encode_training_data(encode_columns(df, len(df)), df['diagnosis'].to_numpy())
+    
+    def _encode_training_data(self, X, labels):
+        from sklearn.preprocessing import LabelEncoder
         
-        # Encode diagnosis
-        le_diagnosis = LabelEncoder()
-        df_encoded['diagnosis'] = le_diagnosis.fit_transform(df['diagnosis'])
-        self.label_encoders['diagnosis'] = le_diagnosis
+        # Inputs are already coded by the feature schema; the gender encoder is
+        # kept in the bundle for older loaders
+        self.label_encoders['gender'] = LabelEncoder().fit(GENDER_CLASSES)
+        self.label_encoders['diagnosis'] = LabelEncoder()
+        y = self.label_encoders['diagnosis'].fit_transform(labels)
+        return X, y
+    
+    def _confirmed_training_data(self, rebuild=False):
+        """Encoded (X, y) from the confirmed cases stored in the database."""
+        from .training_data import load_confirmed_dataset
         
-        self.feature_names = [col for col in df.columns if col != 'diagnosis']
-        return df_encoded
+        X, labels = load_confirmed_dataset(rebuild=rebuild)
+        min_samples = getattr(settings, 'TRAINING_MIN_SAMPLES', 50)
+        if len(labels) < min_samples:
+            raise ValueError(f"Only {len(labels)} confirmed cases, at least {min_samples} are needed to train")
+        return self._encode_training_data(X, labels)
     
-    def train_model(self):
-        df = self.generate_sample_data()
-        df_processed = self.preprocess_data(df)
+    def train_model(self, mode='quick', source='synthetic', rebuild=False):
+        """
+        Train, evaluate and publish a new model version; returns its test accuracy.
+        rebuild=True rereads every confirmed case instead of using the
+        training data cache (source='database' only).
+        """
+        from sklearn.metrics import accuracy_score
+        from sklearn.model_selection import train_test_split
+        from sklearn.tree import DecisionTreeClassifier
+        
+        if mode not in TRAINING_MODES:
+            raise ValueError(f"Unknown training mode: {mode}")
+        if source not in TRAINING_SOURCES:
+            raise ValueError(f"Unknown training source: {source}")
         
-        X = df_processed[self.feature_names]
-        y = df_processed['diagnosis']
+        if source == 'database':
+            X, y = self._confirmed_training_data(rebuild)
+        else:
+            X, y = self.preprocess_data(self.generate_sample_data())
         
+        # Real cases can have rare diagnoses: only stratify when every class can be split
+        stratify = y if np.bincount(y).min() >= 2 else None
         X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42, stratify=y
+            X, y, test_size=0.2, random_state=42, stratify=stratify
         )
         
-        self.model = DecisionTreeClassifier(
-            criterion='entropy',
-            max_depth=8,
-            min_samples_split=5,
-            random_state=42
-        )
-        self.model.fit(X_train, y_train)
+        search = None
+        if mode == 'search':
+            from .model_search import search_models
+            model, search = search_models(X_train, y_train, baseline=('decision_tree', QUICK_TREE_PARAMS))
+        else:
+            model = DecisionTreeClassifier(random_state=42, **QUICK_TREE_PARAMS)
+            model.fit(X_train, y_train)
         
-        y_pred = self.model.predict(X_test)
+        flat_tree = FlatTree(compile_tree(model)) if isinstance(model, DecisionTreeClassifier) else None
+        feature_names = list(FEATURE_COLUMNS)
+        class_table = [
+            str(name) for name in self.label_encoders['diagnosis'].inverse_transform(model.classes_).tolist()
+        ]
+        gender_classes = self.label_encoders['gender'].classes_.tolist()
+        
+        y_pred = model.predict(X_test)
         accuracy = accuracy_score(y_test, y_pred)
         
-        model_path = os.path.join(settings.BASE_DIR, 'medical_model.joblib')
-        joblib.dump({
-            'model': self.model,
-            'encoders': self.label_encoders,
-            'feature_names': self.feature_names,
-            'class_names': self.class_names
-        }, model_path)
+        version = self.registry.publish(
+            {
+                'model': model,
+                'encoders': self.label_encoders,
+                'feature_names': feature_names,
+                'class_names': self.class_names
+            },
+            flat_tree=flat_tree,
+            metadata={
+                'accuracy': float(accuracy),
+                'n_train': len(X_train),
+                'n_test': len(X_test),
+                'feature_names': feature_names,
+                'class_names': class_table,
+                'gender_classes': gender_classes,
+                'estimator': type(model).__name__,
+                'flat_tree': flat_tree is not None,
+                'params': model.get_params(),
+                'mode': mode,
+                'source': source,
+                'search': search,
+            }
+        )
+        with self._reload_lock:
+            self._swap_state(
+                _serving_state(version, flat_tree if flat_tree is not None else model, flat_tree, feature_names, class_table),
+                estimator=model
+            )
+            self._pointer_stamp = self.registry.pointer_stamp()
         
         return accuracy
     
-    def load_model(self):
+    def _load_flat_tree(self, version, model):
+        """Memory-map the version's node table, recompiling it if missing."""
+        if version is not None:
+            try:
+                return FlatTree.load(self.registry.path(version, '.tree.npy'))
+            except (OSError, ValueError):
+                pass
+        return FlatTree(compile_tree(model))
+    
+    def load_model(self, version=None):
+        """Build the serving state of a version (default: current) and swap it in."""
         try:
-            model_path = os.path.join(settings.BASE_DIR, 'medical_model.joblib')
-            saved_data = joblib.load(model_path)
-            self.model = saved_data['model']
-            self.label_encoders = saved_data['encoders']
-            self.feature_names = saved_data['feature_names']
-            self.class_names = saved_data['class_names']
+            if version is None:
+                version = self.registry.current_version()
+            
+            # Serving only needs the node table and the sidecar: the sklearn
+            # bundle is unpickled later, if plotting or importances ask for it
+            metadata = self.registry.metadata(version) if version is not None else None
+            if metadata and 'gender_classes' in metadata:
+                if metadata.get('flat_tree', True):
+                    flat_tree = FlatTree.load(self.registry.path(version, '.tree.npy'))
+                    predictor = flat_tree
+                    model = None
+                else:
+                    # Ensembles have no flat export and predict through sklearn
+                    flat_tree = None
+                    predictor = model = self._load_bundle(version)['model']
+                self._swap_state(
+                    _serving_state(version, predictor, flat_tree, metadata['feature_names'], metadata['class_names']),
+                    estimator=model
+                )
+                return True
+            
+            saved_data = self._load_bundle(version)
+            model = saved_data['model']
+            flat_tree = self._load_flat_tree(version, model)
+            class_table = saved_data['encoders']['diagnosis'].inverse_transform(model.classes_).tolist()
+            self._swap_state(
+                _serving_state(version or 'legacy', flat_tree, flat_tree, saved_data['feature_names'], class_table),
+                estimator=model
+            )
             return True
         except:
             return False
     
-    def predict(self, patient_data):
-        if not self.model:
-            if not self.load_model():
-                return None, None
+    def _load_bundle(self, version):
+        if version is not None and version != 'legacy':
+            return self.registry.load(version)
+        # Model trained before the registry existed
+        import joblib
+        model_path = os.path.join(settings.BASE_DIR, 'medical_model.joblib')
+        return joblib.load(model_path)
+    
+    def get_estimator(self):
+        """Return the fitted sklearn estimator of the current version, unpickling it on first use."""
+        if not self.ensure_current():
+            return None
+        return self._estimator_for(self._state.version)
+    
+    def _estimator_for(self, version):
+        estimator = self._estimator
+        if estimator is None or estimator[0] != version:
+            with self._reload_lock:
+                estimator = self._estimator
+                if estimator is None or estimator[0] != version:
+                    estimator = (version, self._load_bundle(version)['model'])
+                    self._estimator = estimator
+        return estimator[1]
+    
+    def ensure_current(self):
+        """
+        Make sure the latest published version is loaded.
+        Costs one stat() of the registry pointer when nothing changed.
+        Returns False if no model is available.
+        """
+        stamp = self.registry.pointer_stamp()
+        if self._state is not None and stamp == self._pointer_stamp:
+            return True
         
-        # Create DataFrame from input
-        input_data = pd.DataFrame([patient_data])
+        with self._reload_lock:
+            if self._state is None or stamp != self._pointer_stamp:
+                version = self.registry.current_version()
+                if self._state is None or version != self._state.version:
+                    if not self.load_model(version):
+                        return self._state is not None
+                self._pointer_stamp = stamp
+        return True
+    
+    def warm_up(self):
+        """
+        Load the current model and run one throwaway prediction, so the node
+        table, lookup tables and row buffer exist before the first request.
+        Returns False if no model is available.
+        """
+        if not self.ensure_current():
+            return False
+        
+        self.predict(sample_input())
+        self.prediction_cache.clear()
+        return True
+    
+    @staticmethod
+    def _model_input(state, X):
+        return X if state.model_columns is None else X[:, state.model_columns]
+    
+    def predict(self, patient_data, explain=False):
+        """
+        Return (diagnosis, probabilities). With explain=True, return
+        (diagnosis, probabilities, decision_path): the split tests met on the
+        way to the leaf, or None when the model is not a single decision tree.
+        """
+        with metrics.span(STAGE_METRIC, stage='model_load'):
+            ready = self.ensure_current()
+        if not ready:
+            return (None, None, None) if explain else (None, None)
+        
+        # Read once: every table below belongs to the same model version
+        state = self._state
         
-        # Encode gender
-        if 'gender' in self.label_encoders:
-            input_data['gender'] = self.label_encoders['gender'].transform(input_data['gender'])
+        with metrics.span(STAGE_METRIC, stage='encode'):
+            # Reuse one preallocated row per thread, filled by the feature schema
+            row = getattr(self._row_buffers, 'row', None)
+            if row is None:
+                row = np.empty((1, len(FEATURE_COLUMNS)), dtype=np.float64)
+                self._row_buffers.row = row
             
-        # Ensure correct column order
-        input_data = input_data[self.feature_names]
+            row = self._model_input(state, encode_rows([patient_data], out=row))
         
-        prediction = self.model.predict(input_data)[0]
-        probabilities = self.model.predict_proba(input_data)[0]
+        if explain:
+            return self._predict_explained(state, row)
         
-        diagnosis = self.label_encoders['diagnosis'].inverse_transform([prediction])[0]
+        # Repeated panels (reruns, resubmissions, retries) skip inference
+        cache_key = (state.version, tuple(row[0].tolist()))
+        cached = self.prediction_cache.get(cache_key)
+        if cached is not None:
+            diagnosis, prob_dict = cached
+            return diagnosis, dict(prob_dict)
         
-        # Map probabilities to class names
-        prob_dict = {}
-        for i, prob in enumerate(probabilities):
-            # Get class name from encoder
-            class_idx = self.model.classes_[i]
-            class_name = self.label_encoders['diagnosis'].inverse_transform([class_idx])[0]
-            prob_dict[class_name] = float(prob)
+        with metrics.span(STAGE_METRIC, stage='predict_proba'):
+            probabilities = state.predictor.predict_proba(row)[0]
+        diagnosis = state.class_table[int(probabilities.argmax())]
+        
+        prob_dict = {
+            class_name: float(prob)
+            for class_name, prob in zip(state.class_table, probabilities)
+        }
+        self.prediction_cache.put(cache_key, (diagnosis, dict(prob_dict)))
         
         return diagnosis, prob_dict
     
+    def _predict_explained(self, state, row):
+        explainer = state.explainer
+        with metrics.span(STAGE_METRIC, stage='predict_proba'):
+            if explainer is None:
+                probabilities = state.predictor.predict_proba(row)[0]
+                path = None
+            else:
+                # Leaf and path come from the same walk of the tree
+                nodes = explainer.tree.decision_path_row(row[0])
+                probabilities = explainer.tree.value[nodes[-1]]
+                path = explainer.decision_path(row[0], nodes)
+        
+        prob_dict = {
+            class_name: float(prob)
+            for class_name, prob in zip(state.class_table, probabilities)
+        }
+        return state.class_table[int(probabilities.argmax())], prob_dict, path
+    
+    def get_rules(self):
+        """
+        One if/then rule per leaf of the current decision tree, extracted once
+        per model version. None when no model is loaded or it is not a single tree.
+        """
+        if not self.ensure_current():
+            return None
+        explainer = self._state.explainer
+        return explainer.rules() if explainer is not None else None
+    
+    def predict_batch(self, patients):
+        """
+        Predict a list of patient dicts in one pass.
+        Returns a list of (diagnosis, probabilities) tuples in input order.
+        """
+        with metrics.span(STAGE_METRIC, stage='model_load'):
+            ready = self.ensure_current()
+        if not ready:
+            return None
+        
+        if not patients:
+            return []
+        
+        state = self._state
+        
+        with metrics.span(STAGE_METRIC, stage='batch_encode'):
+            X = self._model_input(state, encode_rows(patients))
+        
+        with metrics.span(STAGE_METRIC, stage='batch_predict_proba'):
+            probabilities = state.predictor.predict_proba(X)
+            predictions = probabilities.argmax(axis=1)
+        
+        results = []
+        for row, pred in zip(probabilities, predictions):
+            prob_dict = {
+                class_name: float(prob)
+                for class_name, prob in zip(state.class_table, row)
+            }
+            results.append((state.class_table[pred], prob_dict))
+        
+        return results
+    
     def visualize_tree(self):
-        if not self.model:
+        """Return the cached tree PNG as a base64 string."""
+        path = self.render_tree_image('png')
+        if path is None:
             return None
-            
+        
+        with open(path, 'rb') as f:
+            return base64.b64encode(f.read()).decode('utf-8')
+    
+    def render_tree_image(self, fmt='png'):
+        """
+        Return the path of the tree image for the current model version, or
+        None when no model is loaded or it is not a single decision tree.
+        The figure is only drawn the first time a version/format is requested.
+        """
+        if fmt not in TREE_IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format: {fmt}")
+        if not self.ensure_current():
+            return None
+        state = self._state
+        if state.flat_tree is None:
+            return None
+        
+        cache_dir = getattr(settings, 'TREE_IMAGE_CACHE_DIR', os.path.join(settings.BASE_DIR, 'cache', 'tree'))
+        path = os.path.join(cache_dir, f'{state.version}.{fmt}')
+        if os.path.exists(path):
+            record_cache('tree_image', hit=True)
+            return path
+        record_cache('tree_image', hit=False)
+        
+        # pyplot keeps global state: draw one figure at a time
+        with _plot_lock:
+            if not os.path.exists(path):
+                os.makedirs(cache_dir, exist_ok=True)
+                image = self._draw_tree(state, fmt)
+                fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(image)
+                os.replace(tmp_path, path)
+        
+        return path
+    
+    def _draw_tree(self, state, fmt):
+        import matplotlib
+        matplotlib.use('Agg')  # Use non-GUI backend to prevent macOS crash
+        import matplotlib.pyplot as plt
+        from sklearn.tree import plot_tree
+        
         plt.figure(figsize=(20, 10))
-        plot_tree(self.model,
-                 feature_names=self.feature_names,
-                 class_names=self.label_encoders['diagnosis'].classes_,
+        plot_tree(self._estimator_for(state.version),
+                 feature_names=state.feature_names,
+                 class_names=state.class_table,
                  filled=True,
                  rounded=True,
                  fontsize=8)
@@ -174,23 +596,79 @@ class MedicalDiagnosisModel:
         plt.tight_layout()
         
         buffer = BytesIO()
-        plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
-        buffer.seek(0)
-        image_png = buffer.getvalue()
+        plt.savefig(buffer, format=fmt, dpi=150, bbox_inches='tight')
+        image = buffer.getvalue()
         buffer.close()
-        
-        graphic = base64.b64encode(image_png).decode('utf-8')
         plt.close()
         
-        return graphic
+        return image
+    
+    def export_portable(self, path):
+        """
+        Write the current decision tree, its encoders and feature order as a
+        standalone JSON file for portable_runtime.PortableModel.
+        Returns the exported model version.
+        """
+        from .portable_runtime import FORMAT, FORMAT_VERSION
+        
+        if not self.ensure_current():
+            raise ValueError("No trained model to export")
+        state = self._state
+        tree = state.flat_tree
+        if tree is None:
+            raise ValueError("Only decision tree models can be exported")
+        
+        spec = {
+            'format': FORMAT,
+            'format_version': FORMAT_VERSION,
+            'model_version': state.version,
+            'inputs': [{'name': f.name, 'kind': f.kind} for f in INPUT_FEATURES],
+            'derived': [
+                {'name': r.name, 'op': 'ratio', 'numerator': r.numerator, 'denominator': r.denominator}
+                for r in DERIVED_FEATURES
+            ],
+            'encoders': {
+                **{f.name: list(f.options) for f in INPUT_FEATURES if f.kind == 'choice'},
+                'diagnosis': state.class_table,
+            },
+            'feature_names': state.feature_names,
+            # Flat node table (see tree_engine): leaves point to themselves
+            'tree': {
+                'max_depth': tree.max_depth,
+                'feature': tree.feature.tolist(),
+                'threshold': tree.threshold.tolist(),
+                'left': tree.left.tolist(),
+                'right': tree.right.tolist(),
+                'value': tree.value.tolist(),
+            },
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(spec, f, separators=(',', ':'))
+        return state.version
     
     def get_feature_importance(self):
-        if not self.model:
+        if not self.ensure_current():
             return None
-            
+        state = self._state
+        model = self._estimator_for(state.version)
+        
+        import pandas as pd
         importance_df = pd.DataFrame({
-            'feature': self.feature_names,
-            'importance': self.model.feature_importances_
+            'feature': state.feature_names,
+            'importance': model.feature_importances_
         }).sort_values('importance', ascending=False)
         
-        return importance_df
\ No newline at end of file
+        return importance_df
+
+
+# Process-wide instance shared by all views
+_shared_model = MedicalDiagnosisModel()
+
+def get_model():
+    return _shared_model
+
+def _model_info():
+    state = _shared_model._state
+    return [({'version': state.version if state is not None else 'none'}, 1 if state is not None else 0)]
+
+metrics.register_gauge('diagnosis_model_info', _model_info)
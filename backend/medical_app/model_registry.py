@@ -0,0 +1,119 @@
+"""
+Versioned, on-disk store for trained models.
+
+Each published model is written as <version>.joblib (estimator + encoders),
+<version>.tree.npy (flat node table, see tree_engine) and <version>.json
+(metadata sidecar). The version is the first 12 hex digits of the bundle's
+SHA-256. A CURRENT pointer file names the live version; every file is written
+to a temporary name and moved into place with os.replace, so readers never see
+a partial artifact.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from django.conf import settings
+from django.utils import timezone
+
+
+class ModelRegistry:
+    def __init__(self, root):
+        self.root = Path(root)
+        self.pointer_path = self.root / 'CURRENT'
+
+    def path(self, version, suffix):
+        return self.root / f'{version}{suffix}'
+
+    def _atomic_write(self, target, write):
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def publish(self, bundle, flat_tree=None, metadata=None):
+        """Store a model bundle, make it the current version and return the version."""
+        import joblib
+        
+        buffer = BytesIO()
+        joblib.dump(bundle, buffer)
+        payload = buffer.getvalue()
+        sha256 = hashlib.sha256(payload).hexdigest()
+        version = sha256[:12]
+        self._atomic_write(self.path(version, '.joblib'), lambda f: f.write(payload))
+
+        if flat_tree is not None:
+            self._atomic_write(self.path(version, '.tree.npy'), flat_tree.save)
+
+        sidecar = {
+            'version': version,
+            'sha256': sha256,
+            'created_at': timezone.now().isoformat(),
+            **(metadata or {}),
+        }
+        self._atomic_write(
+            self.path(version, '.json'),
+            lambda f: f.write(json.dumps(sidecar, indent=2).encode('utf-8'))
+        )
+
+        # Flip the pointer last: workers only ever see complete versions
+        self._atomic_write(self.pointer_path, lambda f: f.write(version.encode('ascii')))
+        self.prune()
+        return version
+
+    def pointer_stamp(self):
+        """Cheap change marker for the CURRENT pointer (None when unpublished)."""
+        try:
+            stat = os.stat(self.pointer_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def current_version(self):
+        try:
+            return self.pointer_path.read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def metadata(self, version):
+        try:
+            return json.loads(self.path(version, '.json').read_text())
+        except FileNotFoundError:
+            return None
+
+    def load(self, version):
+        import joblib
+        return joblib.load(self.path(version, '.joblib'))
+
+    def prune(self, keep=None):
+        """Delete the oldest versions beyond `keep`, never the current one."""
+        if keep is None:
+            keep = getattr(settings, 'MODEL_REGISTRY_KEEP', 5)
+
+        current = self.current_version()
+        sidecars = sorted(
+            self.root.glob('*.json'),
+            key=lambda p: p.stat().st_mtime_ns,
+            reverse=True
+        )
+        for sidecar in sidecars[keep:]:
+            version = sidecar.name[:-len('.json')]
+            if version == current:
+                continue
+            for suffix in ('.joblib', '.tree.npy', '.json'):
+                try:
+                    os.remove(self.path(version, suffix))
+                except FileNotFoundError:
+                    pass
+
+
+def get_registry():
+    root = getattr(settings, 'MODEL_REGISTRY_DIR', os.path.join(settings.BASE_DIR, 'model_registry'))
+    return ModelRegistry(root)
@@ -0,0 +1,139 @@
+"""
+Cross-validated hyperparameter search for the diagnosis model.
+
+Candidates are tried one estimator family at a time (decision tree, random
+forest, gradient boosting), each scored with stratified k-fold cross-validation
+whose folds run in parallel joblib workers. The first parameter of each grid is
+its complexity (max_depth), listed from the simplest setting to the most
+complex. Every candidate of a complexity level is tried, and a family stops
+early once its best score has not improved by MODEL_SEARCH_MIN_DELTA for
+MODEL_SEARCH_PATIENCE levels in a row.
+
+The quick training configuration is scored first as the baseline, and a
+candidate only replaces it by beating its score by more than
+MODEL_SEARCH_MIN_DELTA: the search never publishes a model that cross-validates
+worse than not searching.
+"""
+import itertools
+from django.conf import settings
+
+# Complexity parameter first in every grid (see the module docstring)
+SEARCH_SPACE = {
+    'decision_tree': {
+        'max_depth': [4, 6, 8, 10, 12, None],
+        'min_samples_split': [2, 5, 10, 20],
+        'criterion': ['gini', 'entropy'],
+    },
+    'random_forest': {
+        'max_depth': [6, 8, 12, None],
+        'min_samples_split': [2, 5, 10],
+        'n_estimators': [100],
+    },
+    'gradient_boosting': {
+        'max_depth': [2, 3, 4],
+        'learning_rate': [0.1, 0.05],
+        'n_estimators': [100],
+    },
+}
+
+
+def build_estimator(family, params):
+    if family == 'decision_tree':
+        from sklearn.tree import DecisionTreeClassifier
+        return DecisionTreeClassifier(random_state=42, **params)
+    if family == 'random_forest':
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(random_state=42, **params)
+    if family == 'gradient_boosting':
+        from sklearn.ensemble import GradientBoostingClassifier
+        return GradientBoostingClassifier(random_state=42, **params)
+    raise ValueError(f"Unknown estimator family: {family}")
+
+
+def iter_candidates(grid):
+    names = list(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def iter_levels(grid):
+    """Candidates grouped by complexity level (value of the grid's first parameter)."""
+    complexity = next(iter(grid))
+    for _, level in itertools.groupby(iter_candidates(grid), key=lambda params: params[complexity]):
+        yield list(level)
+
+
+def search_models(X, y, baseline, families=None, folds=None, n_jobs=None, patience=None, min_delta=None):
+    """
+    Cross-validate the candidates and refit the best one on all of X, y.
+    baseline is the (family, params) of the quick configuration; it wins
+    unless a candidate beats it by more than min_delta.
+    Returns (fitted estimator, report); report['leaderboard'] lists every
+    candidate tried, best first, with its fold timings.
+    """
+    from sklearn.model_selection import StratifiedKFold, cross_validate
+
+    families = families or list(SEARCH_SPACE)
+    folds = folds or getattr(settings, 'MODEL_SEARCH_FOLDS', 5)
+    n_jobs = n_jobs or getattr(settings, 'MODEL_SEARCH_JOBS', -1)
+    patience = patience or getattr(settings, 'MODEL_SEARCH_PATIENCE', 2)
+    if min_delta is None:
+        min_delta = getattr(settings, 'MODEL_SEARCH_MIN_DELTA', 0.001)
+
+    cv = StratifiedKFold(n_splits=folds, shuffle=True, random_state=42)
+    leaderboard = []
+    stopped_early = []
+
+    def evaluate(family, params, is_baseline=False):
+        scores = cross_validate(
+            build_estimator(family, params), X, y,
+            cv=cv, scoring='accuracy', n_jobs=n_jobs
+        )
+        entry = {
+            'estimator': family,
+            'params': params,
+            'cv_accuracy': float(scores['test_score'].mean()),
+            'cv_std': float(scores['test_score'].std()),
+            'fit_seconds': float(scores['fit_time'].mean()),
+            'predict_seconds': float(scores['score_time'].mean()),
+            'baseline': is_baseline,
+        }
+        leaderboard.append(entry)
+        return entry['cv_accuracy']
+
+    baseline_family, baseline_params = baseline
+    baseline_score = evaluate(baseline_family, baseline_params, is_baseline=True)
+
+    for family in families:
+        best_score = None
+        stale = 0
+        for level in iter_levels(SEARCH_SPACE[family]):
+            level_scores = [
+                baseline_score if (family, params) == (baseline_family, baseline_params) else evaluate(family, params)
+                for params in level
+            ]
+            if best_score is None or max(level_scores) > best_score + min_delta:
+                best_score = max(level_scores)
+                stale = 0
+            else:
+                stale += 1
+                if stale >= patience:
+                    stopped_early.append(family)
+                    break
+
+    # Ties go to the candidate tried first: the baseline, then the simpler ones
+    leaderboard = sorted(leaderboard, key=lambda entry: -entry['cv_accuracy'])
+    best = leaderboard[0]
+    if best['cv_accuracy'] <= baseline_score + min_delta:
+        best = next(entry for entry in leaderboard if entry['baseline'])
+    model = build_estimator(best['estimator'], best['params'])
+    model.fit(X, y)
+
+    return model, {
+        'folds': folds,
+        'candidates': len(leaderboard),
+        'stopped_early': stopped_early,
+        'baseline_cv_accuracy': baseline_score,
+        'selected': {'estimator': best['estimator'], 'params': best['params'], 'cv_accuracy': best['cv_accuracy']},
+        'leaderboard': leaderboard,
+    }
@@ -1,4 +1,6 @@
+import uuid
 from django.db import models
+from .features import INPUT_NAMES
 
 class PatientData(models.Model):
     age = models.IntegerField()
@@ -29,8 +31,90 @@ class PatientData(models.Model):
         ('HEPATIQUE', 'Insuffisance Hépatique'),
     ]
     diagnosis = models.CharField(max_length=20, choices=DIAGNOSIS_CHOICES, blank=True)
+    
+    # Prediction details, stored so results can be shown without rerunning the model
+    probabilities = models.JSONField(null=True, blank=True, help_text="Class probabilities {diagnosis: p}")
+    model_version = models.CharField(max_length=64, blank=True)
+    inference_ms = models.FloatField(null=True, blank=True, help_text="Model inference time (ms)")
+    
     created_at = models.DateTimeField(auto_now_add=True)
     prediction_made = models.BooleanField(default=False)
     
+    # Set when a clinician confirms (or corrects) the diagnosis; only confirmed
+    # rows are used as training data
+    diagnosis_confirmed = models.BooleanField(default=False)
+    confirmed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        # Partial indexes for the history queries (prediction_made rows only),
+        # newest first to match the created_at/id cursor. The trailing columns
+        # are the ones the history list projects, plus prediction_made: SQLite
+        # rereads the table for a column that only appears in the index
+        # condition, so the history list is served from the index alone.
+        indexes = [
+            models.Index(
+                fields=['-created_at', '-id', 'diagnosis', 'age', 'gender', 'prediction_made'],
+                condition=models.Q(prediction_made=True),
+                name='patient_history_idx',
+            ),
+            models.Index(
+                fields=['diagnosis', '-created_at', '-id', 'age', 'gender', 'prediction_made'],
+                condition=models.Q(prediction_made=True),
+                name='patient_history_diag_idx',
+            ),
+            models.Index(
+                fields=['age', '-created_at'],
+                condition=models.Q(prediction_made=True),
+                name='patient_history_age_idx',
+            ),
+            # Incremental training pulls confirmed rows past a watermark
+            models.Index(
+                fields=['confirmed_at', 'id'],
+                condition=models.Q(diagnosis_confirmed=True),
+                name='patient_confirmed_idx',
+            ),
+        ]
+    
+    # Inputs of the diagnosis model, as submitted to /api/predict/
+    FEATURE_FIELDS = INPUT_NAMES
+    
+    def features(self):
+        return {field: getattr(self, field) for field in self.FEATURE_FIELDS}
+    
+    def __str__(self):
+        return f"Patient {self.id} - {self.get_diagnosis_display()}"
+
+
+class TrainingJob(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    
+    STATUS_CHOICES = [
+        ('PENDING', 'En attente'),
+        ('RUNNING', 'En cours'),
+        ('SUCCESS', 'Terminé'),
+        ('FAILED', 'Échec'),
+    ]
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    
+    MODE_CHOICES = [
+        ('quick', 'Arbre de décision fixe'),
+        ('search', "Recherche d'hyperparamètres (validation croisée)"),
+    ]
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES, default='quick')
+    
+    SOURCE_CHOICES = [
+        ('synthetic', 'Données synthétiques'),
+        ('database', 'Cas confirmés'),
+    ]
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='synthetic')
+    accuracy = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    
+    # Timings
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_seconds = models.FloatField(null=True, blank=True)
+    
     def __str__(self):
-        return f"Patient {self.id} - {self.get_diagnosis_display()}"
\ No newline at end of file
+        return f"Training {self.id} - {self.get_status_display()}"
\ No newline at end of file
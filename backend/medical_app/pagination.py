@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class HistoryCursorPagination(CursorPagination):
+    # Matches the composite history indexes on PatientData
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'limit'
+    max_page_size = 500
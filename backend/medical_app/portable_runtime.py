@@ -0,0 +1,113 @@
+"""
+Standalone runtime for exported diagnosis models (MedicalDiagnosisModel.export_portable).
+
+Only needs the standard library and NumPy: no Django, scikit-learn, SciPy or
+pandas, so this file can be copied on its own to machines that cannot install
+the full stack. Predictions match MedicalDiagnosisModel.predict exactly.
+
+    model = PortableModel.load('model.json')
+    diagnosis, probabilities = model.predict({'age': 55, 'gender': 'M', ...})
+"""
+import json
+import numpy as np
+
+FORMAT = 'medical-diagnosis-tree'
+FORMAT_VERSION = 1
+
+
+class PortableModel:
+    def __init__(self, spec):
+        if spec.get('format') != FORMAT:
+            raise ValueError(f"Not a {FORMAT} export")
+        if spec.get('format_version', 0) > FORMAT_VERSION:
+            raise ValueError(f"Unsupported format version {spec['format_version']} (runtime supports {FORMAT_VERSION})")
+
+        self.version = spec['model_version']
+        self.feature_names = spec['feature_names']
+        self.class_names = spec['encoders']['diagnosis']
+
+        # Encoded value of each choice, by position in the fitted encoder
+        self._codes = {
+            name: {choice: code for code, choice in enumerate(choices)}
+            for name, choices in spec['encoders'].items() if name != 'diagnosis'
+        }
+        inputs = {item['name'] for item in spec['inputs']}
+        derived = {item['name']: item for item in spec['derived']}
+
+        # How to compute each model column: ('input', name) or ('ratio', numerator, denominator)
+        self._columns = []
+        for name in self.feature_names:
+            if name in inputs:
+                self._columns.append(('input', name))
+            elif name in derived and derived[name]['op'] == 'ratio':
+                self._columns.append(('ratio', derived[name]['numerator'], derived[name]['denominator']))
+            else:
+                raise ValueError(f"Cannot compute feature {name!r}")
+
+        tree = spec['tree']
+        self.feature = np.asarray(tree['feature'], dtype=np.intp)
+        self.threshold = np.asarray(tree['threshold'], dtype=np.float64)
+        self.left = np.asarray(tree['left'], dtype=np.intp)
+        self.right = np.asarray(tree['right'], dtype=np.intp)
+        self.value = np.asarray(tree['value'], dtype=np.float64)
+        self.is_leaf = self.left == np.arange(len(self.left))
+        self.max_depth = tree['max_depth']
+        self._nodes = list(zip(
+            self.feature.tolist(), self.threshold.tolist(),
+            self.left.tolist(), self.right.tolist(), self.is_leaf.tolist()
+        ))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def _input(self, patient, name):
+        value = patient[name]
+        codes = self._codes.get(name)
+        return codes[value] if codes is not None else float(value)
+
+    def encode(self, patients):
+        """Feature matrix in the model's column order."""
+        X = np.empty((len(patients), len(self._columns)), dtype=np.float64)
+        for col, column in enumerate(self._columns):
+            if column[0] == 'input':
+                X[:, col] = [self._input(patient, column[1]) for patient in patients]
+            else:
+                numerator = np.array([self._input(patient, column[1]) for patient in patients])
+                denominator = np.array([self._input(patient, column[2]) for patient in patients])
+                X[:, col] = np.divide(numerator, denominator, out=np.zeros(len(patients)), where=denominator != 0)
+        return X
+
+    def apply(self, X):
+        """Leaf index reached by each row of an encoded matrix."""
+        # Compare in float32 against float64 thresholds, as scikit-learn does
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])
+        nodes = np.zeros(X.shape[0], dtype=np.intp)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def _apply_row(self, x):
+        x = np.asarray(x, dtype=np.float32).tolist()
+        node = 0
+        feature, threshold, left, right, is_leaf = self._nodes[node]
+        while not is_leaf:
+            node = left if x[feature] <= threshold else right
+            feature, threshold, left, right, is_leaf = self._nodes[node]
+        return node
+
+    def _result(self, probabilities):
+        prob_dict = {name: float(p) for name, p in zip(self.class_names, probabilities)}
+        return self.class_names[int(probabilities.argmax())], prob_dict
+
+    def predict(self, patient):
+        """Return (diagnosis, {diagnosis: probability}) for one patient dict."""
+        return self._result(self.value[self._apply_row(self.encode([patient])[0])])
+
+    def predict_batch(self, patients):
+        if not patients:
+            return []
+        return [self._result(row) for row in self.value[self.apply(self.encode(patients))]]
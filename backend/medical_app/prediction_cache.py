@@ -0,0 +1,46 @@
+import threading
+import time
+from collections import OrderedDict
+from .metrics import record_cache
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache with a time-to-live for prediction results.
+    Keys are (model version, encoded feature tuple), so a retrain never
+    serves results from the previous model.
+    """
+    def __init__(self, max_entries=10000, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        
+        record_cache('prediction', hit=entry is not None)
+        return entry[1] if entry is not None else None
+    
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,153 @@
+"""
+Content-addressed disk cache for rendered documents.
+
+Files are named by the SHA-256 of everything that affects the output, so a
+changed input simply produces a new key. Hits refresh the file's mtime and
+the oldest files are evicted once the directory grows past max_bytes.
+
+Each process keeps an approximate size of the directory: the total from its
+last scan plus what it wrote since. The directory is only scanned again once
+that estimate passes max_bytes, or after RESCAN_SECONDS so that other workers'
+writes are counted too. Eviction goes down to EVICT_TO of max_bytes, so a full
+cache is not rescanned on every new document. Any worker may evict a file another one is about to
+read, so readers treat a vanished file as a miss (read_or_render).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from django.conf import settings
+from .metrics import record_cache
+
+RESCAN_SECONDS = 60
+EVICT_TO = 0.9
+
+
+class RenderCache:
+    def __init__(self, root, max_bytes, name='render'):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.name = name
+        self._size = None  # Approximate bytes in root, None until the first scan
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts):
+        payload = json.dumps(parts, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()
+
+    def path(self, key, suffix):
+        return os.path.join(self.root, f'{key}{suffix}')
+
+    def get(self, key, suffix):
+        path = self.path(key, suffix)
+        try:
+            # Touch on hit: mtime doubles as the LRU clock
+            os.utime(path)
+        except FileNotFoundError:
+            record_cache(self.name, hit=False)
+            return None
+        record_cache(self.name, hit=True)
+        return path
+
+    def read(self, key, suffix):
+        """Cached bytes, or None on a miss (including a file evicted meanwhile)."""
+        path = self.get(key, suffix)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, suffix, data, evict=True):
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path(key, suffix))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data)
+        if evict:
+            self.evict()
+        return self.path(key, suffix)
+
+    def read_or_render(self, key, suffix, render):
+        """Return the document's bytes, calling render() -> bytes on a miss."""
+        data = self.read(key, suffix)
+        if data is None:
+            data = render()
+            self.put(key, suffix, data)
+        return data
+
+    def evict(self):
+        """
+        Delete least recently used files until the cache fits in max_bytes.
+        Scans the directory only when the running size estimate is over
+        max_bytes or stale.
+        """
+        with self._lock:
+            if (self._size is not None and self._size <= self.max_bytes
+                    and time.monotonic() - self._scanned_at < RESCAN_SECONDS):
+                return
+            self._size = self._scan_and_evict()
+            self._scanned_at = time.monotonic()
+
+    def _scan_and_evict(self):
+        """Evict down to EVICT_TO of max_bytes if over it; return the bytes left in the directory."""
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    if entry.name.endswith('.tmp'):
+                        continue
+                    try:
+                        # Another worker may evict the same file while we scan
+                        if not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                    total += stat.st_size
+        except FileNotFoundError:
+            return 0
+
+        if total <= self.max_bytes:
+            return total
+
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_bytes * EVICT_TO:
+                break
+        return total
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_prescription_cache():
+    """The process's prescription cache: one instance, so its size estimate is shared."""
+    root = getattr(settings, 'PRESCRIPTION_CACHE_DIR', os.path.join(settings.BASE_DIR, 'cache', 'prescriptions'))
+    max_bytes = getattr(settings, 'PRESCRIPTION_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+    with _caches_lock:
+        cache = _caches.get((root, max_bytes))
+        if cache is None:
+            cache = _caches[(root, max_bytes)] = RenderCache(root, max_bytes, name='prescription')
+        return cache
@@ -1,31 +1,76 @@
 from rest_framework import serializers
-from .models import PatientData
+from .models import PatientData, TrainingJob
+from .features import INPUT_FEATURES
+from .ml_model import TRAINING_MODES, TRAINING_SOURCES
 
 class PatientDataSerializer(serializers.ModelSerializer):
+    def __init__(self, *args, **kwargs):
+        # Optional projection: PatientDataSerializer(..., fields=['id', 'diagnosis'])
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+    
     class Meta:
         model = PatientData
         fields = '__all__'
         read_only_fields = ('id', 'created_at', 'prediction_made')
 
 
+class TrainingJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TrainingJob
+        fields = '__all__'
+
+
+class TrainRequestSerializer(serializers.Serializer):
+    mode = serializers.ChoiceField(choices=TRAINING_MODES, default='quick')
+    source = serializers.ChoiceField(choices=TRAINING_SOURCES, default='synthetic')
+    # Reread every confirmed case instead of the training data cache
+    rebuild = serializers.BooleanField(default=False)
+
+
+class ConfirmDiagnosisSerializer(serializers.Serializer):
+    # Omit to confirm the predicted diagnosis as is
+    diagnosis = serializers.ChoiceField(choices=PatientData.DIAGNOSIS_CHOICES, required=False)
+
+
+def feature_field(feature):
+    """Serializer field for a features.Feature."""
+    if feature.kind == 'int':
+        return serializers.IntegerField(min_value=feature.options[0], max_value=feature.options[1])
+    if feature.kind == 'float':
+        return serializers.FloatField(min_value=feature.options[0], max_value=feature.options[1])
+    if feature.kind == 'choice':
+        return serializers.ChoiceField(choices=feature.options)
+    return serializers.BooleanField(default=False)
+
+
 class PredictionRequestSerializer(serializers.Serializer):
-    age = serializers.IntegerField(min_value=1, max_value=120)
-    gender = serializers.ChoiceField(choices=[('M', 'Male'), ('F', 'Female')])
+    # One field per model input, generated from the feature schema
+    def get_fields(self):
+        return {feature.name: feature_field(feature) for feature in INPUT_FEATURES}
+
+
+class BatchPredictionRequestSerializer(serializers.Serializer):
+    patients = PredictionRequestSerializer(many=True, allow_empty=False, max_length=5000)
+
+
+class BulkPrescriptionRequestSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False, max_length=500)
+    date_from = serializers.CharField(required=False)
+    date_to = serializers.CharField(required=False)
     
-    # Lab Results
-    glucose = serializers.FloatField(min_value=0.0, max_value=30.0)
-    cholesterol = serializers.FloatField(min_value=0.0, max_value=15.0)
-    triglycerides = serializers.FloatField(min_value=0.0, max_value=10.0)
-    creatinine = serializers.FloatField(min_value=0.0, max_value=1000.0)
-    uree = serializers.FloatField(min_value=0.0, max_value=50.0)
-    uric_acid = serializers.FloatField(min_value=0.0, max_value=1000.0)
-    got = serializers.FloatField(min_value=0.0, max_value=500.0)
-    gpt = serializers.FloatField(min_value=0.0, max_value=500.0)
-    bilirubin = serializers.FloatField(min_value=0.0, max_value=100.0)
+    # One multi-page PDF, or a ZIP of per-patient documents
+    format = serializers.ChoiceField(choices=['pdf', 'zip'], default='pdf')
+    document = serializers.ChoiceField(choices=['pdf', 'png'], default='pdf')
     
-    smoking = serializers.BooleanField(default=False)
-    obesity = serializers.BooleanField(default=False)
-    family_history = serializers.BooleanField(default=False)
+    def validate(self, data):
+        if 'ids' not in data and 'date_from' not in data and 'date_to' not in data:
+            raise serializers.ValidationError("Provide a list of ids or a date range.")
+        return data
 
 
 class PredictionResponseSerializer(serializers.Serializer):
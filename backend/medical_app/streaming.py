@@ -0,0 +1,29 @@
+"""
+Streaming responses that stay streamed under both WSGI and ASGI.
+
+Given a sync iterator, Django 4.2's StreamingHttpResponse reads the whole body
+into a list before an ASGI server sends the first byte. StreamingResponse pulls
+one chunk at a time instead, in the thread Django runs sync code in under ASGI
+(thread_sensitive), where the view's database cursor lives. Under WSGI it is a
+plain StreamingHttpResponse.
+"""
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+
+_END = object()
+
+
+class StreamingResponse(StreamingHttpResponse):
+    async def __aiter__(self):
+        if self.is_async:
+            async for part in self.streaming_content:
+                yield part
+            return
+
+        chunks = self.streaming_content
+        next_chunk = sync_to_async(next, thread_sensitive=True)
+        while True:
+            part = await next_chunk(chunks, _END)
+            if part is _END:
+                return
+            yield part
@@ -0,0 +1,104 @@
+import os
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from .features import DERIVED_FEATURES, INPUT_FEATURES, INPUT_NAMES, encode_rows, sample_input
+from .management.commands.benchmark import HEAVY_MODULES, STARTUP_RSS_BUDGET_MB, run_startup_probe
+from .ml_model import MedicalDiagnosisModel
+from .portable_runtime import PortableModel
+
+
+class TrainedModelTestCase(SimpleTestCase):
+    """A quick model trained into a temporary registry (cls.model, cls.tmp_dir)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        tmp = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(tmp.cleanup)
+        cls.tmp_dir = tmp.name
+        cls.registry_dir = os.path.join(tmp.name, 'registry')
+        settings_override = override_settings(MODEL_REGISTRY_DIR=cls.registry_dir)
+        settings_override.enable()
+        cls.addClassCleanup(settings_override.disable)
+
+        cls.model = MedicalDiagnosisModel()
+        cls.model.train_model('quick')
+
+
+class StartupTests(TrainedModelTestCase):
+    """A fresh worker serves its first prediction without the training and rendering stack."""
+
+    def test_first_prediction_imports_no_heavy_modules(self):
+        run = run_startup_probe(self.registry_dir)
+        # Import hygiene is exact; the time budget is left to the benchmark,
+        # as it depends on the machine running the tests
+        self.assertEqual(run['heavy_modules'], [], f"imported at startup, out of {', '.join(HEAVY_MODULES)}")
+        self.assertLess(run['rss_bytes'], STARTUP_RSS_BUDGET_MB * 1024 * 1024)
+
+
+class PortableRuntimeParityTests(TrainedModelTestCase):
+    """portable_runtime must predict exactly like the server model it was exported from."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        path = os.path.join(cls.tmp_dir, 'model.json')
+        cls.model.export_portable(path)
+        cls.portable = PortableModel.load(path)
+        cls.patients = cls._patients()
+
+    @classmethod
+    def _patients(cls):
+        """Synthetic patients, every split threshold, risk factors and zero denominators."""
+        df = cls.model.generate_sample_data(500, seed=7)
+        patients = [
+            {name: row[name] for name in INPUT_NAMES}
+            for row in df[INPUT_NAMES].to_dict('records')
+        ]
+
+        base = sample_input()
+        numeric = {f.name for f in INPUT_FEATURES if f.kind in ('int', 'float')}
+        tree = cls.model.flat_tree
+        for node in np.flatnonzero(~tree.is_leaf):
+            name = cls.model.feature_names[tree.feature[node]]
+            if name not in numeric:
+                continue
+            # On the threshold and one float32 step either side of it
+            threshold = np.float32(tree.threshold[node])
+            for value in (np.nextafter(threshold, np.float32(-np.inf)), threshold, np.nextafter(threshold, np.float32(np.inf))):
+                patients.append(dict(base, **{name: float(value)}))
+
+        for feature in INPUT_FEATURES:
+            if feature.kind == 'bool':
+                patients.extend(dict(patient, **{feature.name: not patient[feature.name]}) for patient in patients[:50])
+            elif feature.kind == 'choice':
+                patients.extend(dict(base, **{feature.name: choice}) for choice in feature.options)
+
+        # Ratios: a range of values, then zero denominators
+        for ratio in DERIVED_FEATURES:
+            for scale in (0.25, 0.5, 1.0, 2.0, 4.0):
+                patients.append(dict(base, **{ratio.numerator: base[ratio.denominator] * scale}))
+            patients.append(dict(base, **{ratio.denominator: 0.0}))
+        patients.append(dict(base, **{name: 0.0 for ratio in DERIVED_FEATURES for name in (ratio.numerator, ratio.denominator)}))
+        return patients
+
+    def test_encoding_matches_feature_schema(self):
+        # Derived ratios and risk factor booleans, column for column
+        self.assertEqual(self.portable.feature_names, self.model.feature_names)
+        for ratio in DERIVED_FEATURES:
+            self.assertIn(ratio.name, self.portable.feature_names)
+        np.testing.assert_array_equal(self.portable.encode(self.patients), encode_rows(self.patients))
+
+    def test_single_predictions_match(self):
+        for patient in self.patients:
+            with self.subTest(patient=patient):
+                self.assertEqual(self.portable.predict(patient), self.model.predict(patient))
+
+    def test_batch_predictions_match(self):
+        expected = [tuple(result) for result in self.model.predict_batch(self.patients)]
+        self.assertEqual([tuple(result) for result in self.portable.predict_batch(self.patients)], expected)
+
+        # Batches of one and an empty batch
+        self.assertEqual(self.portable.predict_batch(self.patients[:1]), [self.model.predict(self.patients[0])])
+        self.assertEqual(self.portable.predict_batch([]), [])
@@ -0,0 +1,149 @@
+"""
+Training data from confirmed PatientData rows.
+
+Rows are read with a raw cursor (fetchmany) straight into NumPy arrays, without
+building model instances. The arrays are cached in an .npz file along with a
+(confirmed_at, id) watermark, so a retrain only fetches the rows confirmed
+since the previous one. A row confirmed again (corrected diagnosis) replaces
+its cached copy. The cache only ever gains rows, so it is checked against the
+number of confirmed rows and rebuilt when rows were deleted or unconfirmed.
+"""
+import os
+import tempfile
+from datetime import datetime
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from .features import FEATURE_COLUMNS, INPUT_NAMES, encode_columns
+from .metrics import record_cache
+from .models import PatientData
+
+
+def _confirmed_rows():
+    return PatientData.objects.filter(diagnosis_confirmed=True)
+
+
+def _after(watermark):
+    confirmed_at, last_id = watermark
+    return Q(confirmed_at__gt=confirmed_at) | Q(confirmed_at=confirmed_at, id__gt=last_id)
+
+
+def iter_confirmed_chunks(since=None, until=None, chunk_size=None):
+    """
+    Yield (ids, X, labels) array chunks of confirmed rows in confirmation
+    order, after the `since` watermark and up to and including `until`
+    (each a (confirmed_at, id) tuple, or None for no bound).
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'TRAINING_FETCH_SIZE', 5000)
+
+    queryset = _confirmed_rows()
+    if since is not None:
+        queryset = queryset.filter(_after(since))
+    if until is not None:
+        queryset = queryset.exclude(_after(until))
+    queryset = queryset.order_by('confirmed_at', 'id').values_list('id', 'diagnosis', *INPUT_NAMES)
+    sql, params = queryset.query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+
+            ids, labels, *inputs = zip(*rows)
+            X = encode_columns(dict(zip(INPUT_NAMES, inputs)), len(rows))
+            yield np.array(ids, dtype=np.int64), X, np.array(labels, dtype=str)
+
+
+def _cache_path():
+    return getattr(
+        settings, 'TRAINING_DATA_CACHE',
+        os.path.join(settings.BASE_DIR, 'cache', 'training_data.npz')
+    )
+
+
+def _read_cache(path):
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if data['features'].tolist() != FEATURE_COLUMNS:
+                return None
+            return {
+                'ids': data['ids'],
+                'X': data['X'],
+                'labels': data['labels'],
+                'watermark': (datetime.fromisoformat(str(data['watermark_at'])), int(data['watermark_id'])),
+            }
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _write_cache(path, ids, X, labels, watermark):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(
+                f, ids=ids, X=X, labels=labels,
+                features=np.array(FEATURE_COLUMNS),
+                watermark_at=np.array(watermark[0].isoformat()),
+                watermark_id=np.array(watermark[1]),
+            )
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _fetch(since, until, cached=None):
+    """(ids, X, labels) of the cached rows plus those confirmed in (since, until]."""
+    chunks = list(iter_confirmed_chunks(since, until))
+    ids = [chunk[0] for chunk in chunks]
+    X = [chunk[1] for chunk in chunks]
+    labels = [chunk[2] for chunk in chunks]
+
+    if cached is not None:
+        # Re-confirmed rows come back with their new diagnosis: drop the old copy
+        keep = ~np.isin(cached['ids'], np.concatenate(ids)) if ids else slice(None)
+        ids.insert(0, cached['ids'][keep])
+        X.insert(0, cached['X'][keep])
+        labels.insert(0, cached['labels'][keep])
+
+    return np.concatenate(ids), np.concatenate(X), np.concatenate(labels)
+
+
+def load_confirmed_dataset(rebuild=False):
+    """
+    Return (X, labels) for every confirmed row. Cached arrays are reused and
+    only rows confirmed after their watermark are fetched; rebuild=True
+    ignores the cache. A cache that holds more rows than are confirmed (some
+    were deleted or unconfirmed since) is rebuilt as well.
+    """
+    path = _cache_path()
+    cached = None if rebuild else _read_cache(path)
+
+    # Pin the upper bound first: rows confirmed while we read wait for the next run
+    latest = _confirmed_rows().order_by('-confirmed_at', '-id').values_list('confirmed_at', 'id').first()
+    if latest is None:
+        record_cache('training_data', hit=False)
+        return np.empty((0, len(FEATURE_COLUMNS))), np.empty(0, dtype=str)
+    total = _confirmed_rows().exclude(_after(latest)).count()
+
+    if cached is not None:
+        if cached['watermark'] == latest and len(cached['ids']) == total:
+            record_cache('training_data', hit=True)
+            return cached['X'], cached['labels']
+
+        ids, X, labels = _fetch(cached['watermark'], latest, cached)
+        if len(ids) != total:
+            cached = None
+    record_cache('training_data', hit=cached is not None)
+
+    if cached is None:
+        ids, X, labels = _fetch(None, latest)
+    _write_cache(path, ids, X, labels, latest)
+    return X, labels
@@ -0,0 +1,82 @@
+"""
+Background training jobs.
+
+Jobs run on a single thread inside the web worker process that received the
+request: one training at a time per process, later jobs of that process wait
+in PENDING. Nothing survives the process, so a job whose worker restarts or is
+killed (deploy, HUP, max-requests recycling, OOM) would stay PENDING/RUNNING
+forever. reap_stale_jobs() marks such jobs FAILED once they have been pending
+or running longer than TRAINING_JOB_TIMEOUT; it runs whenever a job is polled
+or submitted.
+"""
+import time
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .ml_model import MedicalDiagnosisModel
+from .models import TrainingJob
+
+# One training at a time per process; requests only enqueue work
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='training')
+
+
+def reap_stale_jobs():
+    """Fail jobs pending or running for longer than TRAINING_JOB_TIMEOUT. Returns how many."""
+    timeout = getattr(settings, 'TRAINING_JOB_TIMEOUT', 3600)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return TrainingJob.objects.filter(
+        Q(status='PENDING', created_at__lt=cutoff) | Q(status='RUNNING', started_at__lt=cutoff)
+    ).update(
+        status='FAILED',
+        error=f"No result after {timeout}s: the worker running this job was probably restarted or stopped",
+        finished_at=timezone.now()
+    )
+
+
+def submit_training_job(ml_model, mode='quick', source='synthetic', rebuild=False):
+    """
+    Create a TrainingJob row and train a new model version in the background.
+    ml_model (the serving instance) is switched to it as soon as it is published.
+    rebuild=True rereads all confirmed cases instead of the training data cache.
+    """
+    reap_stale_jobs()
+    job = TrainingJob.objects.create(mode=mode, source=source)
+    transaction.on_commit(lambda: _executor.submit(_run_training_job, ml_model, job.id, mode, source, rebuild))
+    return job
+
+
+def _run_training_job(ml_model, job_id, mode, source, rebuild=False):
+    close_old_connections()
+    try:
+        # Status changes only apply to a job that was not reaped in the meantime
+        if not TrainingJob.objects.filter(id=job_id, status='PENDING').update(
+            status='RUNNING',
+            started_at=timezone.now()
+        ):
+            return
+        
+        start = time.perf_counter()
+        try:
+            # Train on a separate instance so in-flight predictions are untouched
+            accuracy = MedicalDiagnosisModel().train_model(mode, source, rebuild)
+        except Exception as e:
+            TrainingJob.objects.filter(id=job_id, status='RUNNING').update(
+                status='FAILED',
+                error=str(e),
+                finished_at=timezone.now(),
+                duration_seconds=time.perf_counter() - start
+            )
+            return
+        
+        ml_model.ensure_current()
+        TrainingJob.objects.filter(id=job_id, status='RUNNING').update(
+            status='SUCCESS',
+            accuracy=round(accuracy * 100, 2),
+            finished_at=timezone.now(),
+            duration_seconds=time.perf_counter() - start
+        )
+    finally:
+        connection.close()
@@ -0,0 +1,119 @@
+"""
+Flat-array inference engine for the decision tree.
+
+A fitted DecisionTreeClassifier is compiled into one float64 table with a row
+per node: [feature, threshold, left child, right child, class distribution...].
+The table is saved as a plain .npy file so every worker can memory-map the same
+pages instead of unpickling its own copy of the sklearn estimator.
+"""
+import numpy as np
+
+# Column layout of the compiled node table
+FEATURE = 0
+THRESHOLD = 1
+LEFT = 2
+RIGHT = 3
+N_META_COLUMNS = 4
+
+
+def compile_tree(model):
+    """Export a fitted DecisionTreeClassifier as a flat node table."""
+    tree = model.tree_
+    n_nodes = tree.node_count
+    n_classes = tree.value.shape[2]
+
+    table = np.zeros((n_nodes, N_META_COLUMNS + n_classes), dtype=np.float64)
+
+    node_ids = np.arange(n_nodes)
+    is_leaf = tree.children_left == -1
+
+    # Leaves point to themselves so a fixed number of steps always settles on them
+    table[:, FEATURE] = np.where(is_leaf, 0, tree.feature)
+    table[:, THRESHOLD] = np.where(is_leaf, 0.0, tree.threshold)
+    table[:, LEFT] = np.where(is_leaf, node_ids, tree.children_left)
+    table[:, RIGHT] = np.where(is_leaf, node_ids, tree.children_right)
+
+    # Normalized class distribution, same as predict_proba
+    value = tree.value[:, 0, :]
+    totals = value.sum(axis=1, keepdims=True)
+    totals[totals == 0] = 1.0
+    table[:, N_META_COLUMNS:] = value / totals
+
+    return table
+
+
+class FlatTree:
+    def __init__(self, table):
+        # Plain ndarray view: keeps memory-mapped pages shared without memmap overhead
+        self.table = np.asarray(table)
+        table = self.table
+        self.feature = table[:, FEATURE].astype(np.intp)
+        self.threshold = table[:, THRESHOLD]
+        self.left = table[:, LEFT].astype(np.intp)
+        self.right = table[:, RIGHT].astype(np.intp)
+        self.value = table[:, N_META_COLUMNS:]
+        self.is_leaf = self.left == np.arange(len(table))
+        self.max_depth = self._compute_depth()
+
+        # Python-level copies of the (small) split arrays for the single-row walk
+        self._nodes = list(zip(
+            self.feature.tolist(), self.threshold.tolist(),
+            self.left.tolist(), self.right.tolist(), self.is_leaf.tolist()
+        ))
+
+    def _compute_depth(self):
+        # sklearn stores nodes in depth-first order: parents before children
+        depth = np.zeros(len(self.table), dtype=np.intp)
+        for node in range(len(self.table)):
+            if not self.is_leaf[node]:
+                depth[self.left[node]] = depth[node] + 1
+                depth[self.right[node]] = depth[node] + 1
+        return int(depth.max()) if len(depth) else 0
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        table = np.load(path, mmap_mode='r' if mmap else None)
+        return cls(table)
+
+    def save(self, path):
+        np.save(path, np.ascontiguousarray(self.table))
+
+    def apply(self, X):
+        """Return the leaf index reached by each row of X."""
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])
+        nodes = np.zeros(X.shape[0], dtype=np.intp)
+
+        # Advance every row one tree level at a time
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        return nodes
+
+    def apply_row(self, x):
+        """Return the leaf index reached by a single feature vector."""
+        x = np.asarray(x, dtype=np.float32).tolist()
+        node = 0
+        feature, threshold, left, right, is_leaf = self._nodes[node]
+        while not is_leaf:
+            node = left if x[feature] <= threshold else right
+            feature, threshold, left, right, is_leaf = self._nodes[node]
+        return node
+
+    def decision_path_row(self, x):
+        """Same walk as apply_row, returning every node visited (root first, leaf last)."""
+        x = np.asarray(x, dtype=np.float32).tolist()
+        nodes = [0]
+        feature, threshold, left, right, is_leaf = self._nodes[0]
+        while not is_leaf:
+            nodes.append(left if x[feature] <= threshold else right)
+            feature, threshold, left, right, is_leaf = self._nodes[nodes[-1]]
+        return nodes
+
+    def predict_proba(self, X):
+        X = np.asarray(X)
+        if X.shape[0] == 1:
+            return self.value[[self.apply_row(X[0])]]
+        return self.value[self.apply(X)]
@@ -0,0 +1,151 @@
+"""
+Readable explanations of the flat decision tree (see tree_engine).
+
+Every split is described once per model version as a pair of tests, one per
+branch, in terms of the feature schema: thresholds on numeric features, sets of
+choices, yes/no for risk factors. A prediction's decision path is the list of
+tests met on the way to its leaf. The rules are the same tests merged per
+feature along the path to each leaf: one if/then rule per leaf.
+"""
+from .features import INPUT_FEATURES
+
+_KINDS = {feature.name: feature for feature in INPUT_FEATURES}
+
+
+def _number(value):
+    return f"{value:.6g}"
+
+
+def _choice_condition(name, choices):
+    if len(choices) == 1:
+        return f"{name} = {choices[0]}"
+    return f"{name} in {', '.join(choices)}"
+
+
+def _split_tests(name, threshold):
+    """(left test, right test) of a split `name <= threshold`."""
+    feature = _KINDS.get(name)
+    kind = feature.kind if feature is not None else 'float'  # Derived ratios
+
+    if kind == 'choice':
+        # Choices are coded by position: codes up to the threshold go left
+        left = [choice for code, choice in enumerate(feature.options) if code <= threshold]
+        right = [choice for choice in feature.options if choice not in left]
+        return (
+            {'feature': name, 'operator': 'in', 'value': left, 'condition': _choice_condition(name, left)},
+            {'feature': name, 'operator': 'in', 'value': right, 'condition': _choice_condition(name, right)},
+        )
+    if kind == 'bool':
+        return (
+            {'feature': name, 'operator': '=', 'value': False, 'condition': f"no {name}"},
+            {'feature': name, 'operator': '=', 'value': True, 'condition': name},
+        )
+    return (
+        {'feature': name, 'operator': '<=', 'value': threshold, 'condition': f"{name} <= {_number(threshold)}"},
+        {'feature': name, 'operator': '>', 'value': threshold, 'condition': f"{name} > {_number(threshold)}"},
+    )
+
+
+def _decode(name, value):
+    """Input value as the patient entered it, from its encoded column value."""
+    feature = _KINDS.get(name)
+    if feature is not None and feature.kind == 'choice':
+        return feature.options[int(value)]
+    if feature is not None and feature.kind == 'bool':
+        return bool(value)
+    return float(value)
+
+
+class TreeExplainer:
+    """Split tests and leaf rules of one FlatTree, built once per model version."""
+
+    def __init__(self, flat_tree, feature_names, class_names):
+        self.tree = flat_tree
+        self.feature_names = list(feature_names)
+        self.class_names = list(class_names)
+        self.tests = [
+            None if is_leaf else _split_tests(self.feature_names[feature], threshold)
+            for feature, threshold, is_leaf in zip(
+                flat_tree.feature.tolist(), flat_tree.threshold.tolist(), flat_tree.is_leaf.tolist()
+            )
+        ]
+        self._rules = None
+
+    def decision_path(self, x, nodes):
+        """Tests met by feature vector x along `nodes` (as returned by FlatTree.decision_path_row)."""
+        path = []
+        for node, child in zip(nodes, nodes[1:]):
+            left_test, right_test = self.tests[node]
+            test = left_test if child == self.tree.left[node] else right_test
+            path.append(dict(test, patient_value=_decode(test['feature'], x[self.tree.feature[node]])))
+        return path
+
+    def rules(self):
+        """One rule per leaf, in tree order; computed on first use."""
+        if self._rules is None:
+            self._rules = self._extract_rules()
+        return self._rules
+
+    def _extract_rules(self):
+        rules = []
+        stack = [(0, [])]
+        while stack:
+            node, tests = stack.pop()
+            if self.tests[node] is None:
+                probabilities = self.tree.value[node]
+                conditions = _merge(tests)
+                diagnosis = self.class_names[int(probabilities.argmax())]
+                rules.append({
+                    'leaf': node,
+                    'conditions': conditions,
+                    'diagnosis': diagnosis,
+                    'probabilities': {name: float(p) for name, p in zip(self.class_names, probabilities)},
+                    'rule': f"IF {' AND '.join(c['condition'] for c in conditions) or 'always'} THEN {diagnosis}",
+                })
+                continue
+
+            left_test, right_test = self.tests[node]
+            # Right pushed first so the left subtree comes out first
+            stack.append((int(self.tree.right[node]), tests + [right_test]))
+            stack.append((int(self.tree.left[node]), tests + [left_test]))
+        return rules
+
+
+def _merge(tests):
+    """Combine the tests of a path into one condition per feature (tightest bounds)."""
+    merged = {}
+    for test in tests:
+        name = test['feature']
+        current = merged.get(name)
+        if test['operator'] in ('<=', '>'):
+            low, high = current['bounds'] if current is not None else (None, None)
+            if test['operator'] == '>':
+                low = test['value'] if low is None else max(low, test['value'])
+            else:
+                high = test['value'] if high is None else min(high, test['value'])
+            merged[name] = {'bounds': (low, high)}
+        elif test['operator'] == 'in' and current is not None:
+            merged[name] = dict(test, value=[c for c in current['value'] if c in test['value']])
+        else:
+            merged[name] = test
+
+    conditions = []
+    for name, item in merged.items():
+        if 'bounds' not in item:
+            item = dict(item)
+            if item['operator'] == 'in':
+                item['condition'] = _choice_condition(name, item['value'])
+            conditions.append(item)
+            continue
+
+        low, high = item['bounds']
+        if low is not None and high is not None:
+            conditions.append({
+                'feature': name, 'operator': 'between', 'value': [low, high],
+                'condition': f"{_number(low)} < {name} <= {_number(high)}",
+            })
+        elif low is not None:
+            conditions.append({'feature': name, 'operator': '>', 'value': low, 'condition': f"{name} > {_number(low)}"})
+        else:
+            conditions.append({'feature': name, 'operator': '<=', 'value': high, 'condition': f"{name} <= {_number(high)}"})
+    return conditions
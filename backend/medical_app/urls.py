@@ -1,14 +1,29 @@
 from django.urls import path
 from . import api_views
 from . import api_views
+from . import async_views
 
 urlpatterns = [
     #API endpoints
     path('api/health/', api_views.health_check, name='api_health'),
+    path('api/metrics/', api_views.metrics_view, name='api_metrics'),
     path('api/train/', api_views.train_model_api, name='api_train'),
+    path('api/train/<uuid:job_id>/', api_views.training_job_api, name='api_training_job'),
     path('api/predict/', api_views.predict_api, name='api_predict'),
+    path('api/predict/batch/', api_views.predict_batch_api, name='api_predict_batch'),
+    path('api/model/tree.<str:fmt>', api_views.model_tree_image, name='api_model_tree'),
+    path('api/model/rules/', api_views.model_rules, name='api_model_rules'),
     path('api/history/', api_views.history_api, name='history_api'),
+    path('api/history/export/', api_views.export_history, name='export_history'),
     path('api/results/<int:patient_id>/', api_views.result_detail_api, name='result_detail_api'),
+    path('api/results/<int:patient_id>/confirm/', api_views.confirm_diagnosis_api, name='confirm_diagnosis_api'),
     path('api/prescription/<int:patient_id>/', api_views.download_prescription_pdf, name='download_prescription_pdf'),
+    path('api/prescriptions/bulk/', api_views.bulk_prescriptions_api, name='bulk_prescriptions'),
     path('api/prescription-image/<int:patient_id>/', api_views.view_prescription_image, name='view_prescription_image'),
+
+    # Async versions of the same endpoints, for the ASGI deployment
+    path('api/async/predict/', async_views.predict_api, name='async_predict'),
+    path('api/async/results/<int:patient_id>/', async_views.result_detail_api, name='async_result_detail'),
+    path('api/async/prescription/<int:patient_id>/', async_views.download_prescription_pdf, name='async_prescription_pdf'),
+    path('api/async/prescription-image/<int:patient_id>/', async_views.view_prescription_image, name='async_prescription_image'),
 ]
\ No newline at end of file
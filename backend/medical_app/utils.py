@@ -1,17 +1,66 @@
+import functools
 import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import mm
-from datetime import datetime
-from PIL import Image, ImageDraw, ImageFont
+import os
+from django.conf import settings
+from .render_cache import RenderCache
+
+# ReportLab and Pillow are imported inside the renderers: most processes that
+# import this module (API workers, management commands) never draw a page.
+
+# Bump whenever the PDF or PNG layout changes: it is part of the render cache key
+PRESCRIPTION_TEMPLATE_VERSION = 3
+
+PRESCRIPTION_FIELDS = [
+    'id', 'age', 'gender', 'diagnosis',
+    'glucose', 'cholesterol', 'triglycerides', 'creatinine', 'uree',
+    'uric_acid', 'got', 'gpt', 'bilirubin',
+]
+
+def prescription_cache_key(patient_data, kind):
+    """Hash of everything a rendered prescription depends on."""
+    return RenderCache.make_key(
+        kind,
+        PRESCRIPTION_TEMPLATE_VERSION,
+        [getattr(patient_data, field) for field in PRESCRIPTION_FIELDS],
+        prescription_date(patient_data),
+        get_medications(patient_data.diagnosis),
+    )
+
+def prescription_date(patient_data):
+    # The prediction date, so a document renders identically on every request
+    return patient_data.created_at.strftime("%d/%m/%Y")
 
 def generate_pdf(patient_data):
     """
     Generate a PDF prescription for the given patient data.
     Returns a BytesIO buffer containing the PDF.
     """
+    return generate_bulk_pdf([patient_data])
+
+def generate_bulk_pdf(patients):
+    """
+    Generate one PDF with a prescription page per patient.
+    Returns a BytesIO buffer containing the PDF.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    
     buffer = io.BytesIO()
     p = canvas.Canvas(buffer, pagesize=A4)
+    
+    for patient_data in patients:
+        _draw_prescription_page(p, patient_data)
+        p.showPage()
+    
+    p.save()
+    
+    buffer.seek(0)
+    return buffer
+
+def _draw_prescription_page(p, patient_data):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    
     width, height = A4
     
     # Header
@@ -31,7 +80,7 @@ def generate_pdf(patient_data):
     
     # Patient Info
     p.setFont("Helvetica", 12)
-    date_str = datetime.now().strftime("%d/%m/%Y")
+    date_str = prescription_date(patient_data)
     
     # Right aligned date
     p.drawRightString(width - 20*mm, height - 55*mm, f"Date: {date_str}")
@@ -109,12 +158,6 @@ def generate_pdf(patient_data):
     # Footer
     p.setFont("Helvetica", 10)
     p.drawCentredString(width/2, 30*mm, "Signature du Médecin:")
-    
-    p.showPage()
-    p.save()
-    
-    buffer.seek(0)
-    return buffer
 
 def get_medications(diagnosis):
     if diagnosis == 'DIABETE':
@@ -153,62 +196,120 @@ def get_medications(diagnosis):
     else:
         return ["Consulter un spécialiste pour avis complémentaire"]
 
-def generate_prescription_image(patient_data):
-    """
-    Generate a PNG prescription image for the given patient data.
-    Returns a BytesIO buffer containing the PNG image.
-    """
-    # Create a white image
-    width, height = 800, 1000
-    img = Image.new('RGB', (width, height), color='white')
-    d = ImageDraw.Draw(img)
-    
-    # Try to load a font, fallback to default
-    try:
-        # Try to find a standard font
-        font_large = ImageFont.truetype("Arial.ttf", 36)
-        font_medium = ImageFont.truetype("Arial.ttf", 24)
-        font_small = ImageFont.truetype("Arial.ttf", 18)
-        font_bold = ImageFont.truetype("Arial Bold.ttf", 24)
-    except IOError:
-        # Fallback for Linux/Mac if Arial not found
+# Font files tried in order, in PRESCRIPTION_FONT_DIR when it is set
+FONT_CANDIDATES = {
+    'regular': ['DejaVuSans.ttf', 'Arial.ttf', 'Helvetica.ttc'],
+    'bold': ['DejaVuSans-Bold.ttf', 'Arial Bold.ttf', 'Helvetica.ttc'],
+}
+
+IMAGE_SIZE = (800, 1000)
+
+# Fixed vertical positions of the PNG layout
+IMAGE_PATIENT_Y = 220
+IMAGE_DIAGNOSIS_Y = IMAGE_PATIENT_Y + 2 * 30 + 50
+IMAGE_RESULTS_Y = IMAGE_DIAGNOSIS_Y + 50
+IMAGE_TREATMENT_Y = IMAGE_RESULTS_Y + 30 + len(PRESCRIPTION_FIELDS[4:]) * 25 + 30
+
+def _resolve_font_files():
+    """Return the (regular, bold) font paths, or None to use Pillow's default font."""
+    from PIL import ImageFont
+    
+    font_dir = getattr(settings, 'PRESCRIPTION_FONT_DIR', None)
+    if font_dir:
+        found = {}
+        for style, names in FONT_CANDIDATES.items():
+            paths = [os.path.join(font_dir, name) for name in names]
+            found[style] = next((path for path in paths if os.path.exists(path)), None)
+        if found['regular'] is None:
+            return None
+        return found['regular'], found['bold'] or found['regular']
+    
+    # No configured directory: Pillow's own lookup, then the macOS system font
+    for regular, bold in (('Arial.ttf', 'Arial Bold.ttf'),
+                          ('/System/Library/Fonts/Helvetica.ttc', '/System/Library/Fonts/Helvetica.ttc')):
         try:
-            font_large = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 36)
-            font_medium = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 24)
-            font_small = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 18)
-            font_bold = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 24)
+            ImageFont.truetype(regular, 12)
+            ImageFont.truetype(bold, 12)
+            return regular, bold
         except IOError:
-             # Last resort default font
-            font_large = ImageFont.load_default()
-            font_medium = ImageFont.load_default()
-            font_small = ImageFont.load_default()
-            font_bold = ImageFont.load_default()
+            continue
+    return None
 
+@functools.lru_cache(maxsize=None)
+def get_fonts():
+    """Resolve and load the prescription fonts once per process."""
+    from PIL import ImageFont
+    
+    font_files = _resolve_font_files()
+    if font_files is None:
+        # Last resort default font
+        default = ImageFont.load_default()
+        return {'large': default, 'medium': default, 'small': default, 'bold': default}
+    
+    regular, bold = font_files
+    return {
+        'large': ImageFont.truetype(regular, 36),
+        'medium': ImageFont.truetype(regular, 24),
+        'small': ImageFont.truetype(regular, 18),
+        'bold': ImageFont.truetype(bold, 24),
+    }
+
+@functools.lru_cache(maxsize=None)
+def _prescription_template():
+    """The static part of the PNG prescription, drawn once per process."""
+    from PIL import Image, ImageDraw
+    
+    fonts = get_fonts()
+    width, height = IMAGE_SIZE
+    img = Image.new('RGB', IMAGE_SIZE, color='white')
+    d = ImageDraw.Draw(img)
+    
     # Header
-    d.text((width/2, 50), "HOPITAL DE CIRCONSCRIPTION DE BOUSALEM", fill="black", anchor="ms", font=font_large)
-    d.text((width/2, 90), "SERVICE LABORATOIRE", fill="black", anchor="ms", font=font_medium)
+    d.text((width/2, 50), "HOPITAL DE CIRCONSCRIPTION DE BOUSALEM", fill="black", anchor="ms", font=fonts['large'])
+    d.text((width/2, 90), "SERVICE LABORATOIRE", fill="black", anchor="ms", font=fonts['medium'])
     
     # Line
     d.line((50, 110, width-50, 110), fill="black", width=2)
     
     # Title
-    d.text((width/2, 150), "ORDONNANCE MÉDICALE", fill="black", anchor="ms", font=font_bold)
+    d.text((width/2, 150), "ORDONNANCE MÉDICALE", fill="black", anchor="ms", font=fonts['bold'])
+    
+    # Section titles
+    d.text((50, IMAGE_DIAGNOSIS_Y), "DIAGNOSTIC:", fill="black", font=fonts['bold'])
+    d.text((50, IMAGE_RESULTS_Y), "RÉSULTATS D'ANALYSE:", fill="black", font=fonts['bold'])
+    d.text((50, IMAGE_TREATMENT_Y), "TRAITEMENT PRESCRIT:", fill="black", font=fonts['bold'])
+    
+    # Footer
+    d.text((width/2, height-100), "Signature du Médecin:", fill="black", anchor="ms", font=fonts['medium'])
+    
+    return img
+
+def generate_prescription_image(patient_data):
+    """
+    Generate a PNG prescription image for the given patient data.
+    Returns a BytesIO buffer containing the PNG image.
+    """
+    from PIL import ImageDraw
+    
+    fonts = get_fonts()
+    width, height = IMAGE_SIZE
+    
+    # Only the patient-specific text is drawn per request
+    img = _prescription_template().copy()
+    d = ImageDraw.Draw(img)
     
     # Patient Info
-    date_str = datetime.now().strftime("%d/%m/%Y")
-    d.text((width-50, 180), f"Date: {date_str}", fill="black", anchor="rs", font=font_small)
+    date_str = prescription_date(patient_data)
+    d.text((width-50, 180), f"Date: {date_str}", fill="black", anchor="rs", font=fonts['small'])
     
-    y = 220
-    d.text((50, y), f"Patient ID: {patient_data.id}", fill="black", font=font_small)
+    y = IMAGE_PATIENT_Y
+    d.text((50, y), f"Patient ID: {patient_data.id}", fill="black", font=fonts['small'])
     y += 30
-    d.text((50, y), f"Age: {patient_data.age} ans", fill="black", font=font_small)
+    d.text((50, y), f"Age: {patient_data.age} ans", fill="black", font=fonts['small'])
     y += 30
-    d.text((50, y), f"Sexe: {'Masculin' if patient_data.gender == 'M' else 'Féminin'}", fill="black", font=font_small)
+    d.text((50, y), f"Sexe: {'Masculin' if patient_data.gender == 'M' else 'Féminin'}", fill="black", font=fonts['small'])
     
     # Diagnosis
-    y += 50
-    d.text((50, y), "DIAGNOSTIC:", fill="black", font=font_bold)
-    
     diagnosis_map = {
         'SAIN': 'Patient Sain',
         'DIABETE': 'Diabète',
@@ -219,12 +320,10 @@ def generate_prescription_image(patient_data):
     diagnosis_display = diagnosis_map.get(patient_data.diagnosis, patient_data.diagnosis)
     
     color = (0, 128, 0) if patient_data.diagnosis == 'SAIN' else (204, 51, 51)
-    d.text((250, y), diagnosis_display, fill=color, font=font_medium)
+    d.text((250, IMAGE_DIAGNOSIS_Y), diagnosis_display, fill=color, font=fonts['medium'])
     
     # Lab Results
-    y += 50
-    d.text((50, y), "RÉSULTATS D'ANALYSE:", fill="black", font=font_bold)
-    y += 30
+    y = IMAGE_RESULTS_Y + 30
     
     results = [
         f"Glucose: {patient_data.glucose} mmol/L",
@@ -239,24 +338,28 @@ def generate_prescription_image(patient_data):
     ]
     
     for res in results:
-        d.text((80, y), f"- {res}", fill="black", font=font_small)
+        d.text((80, y), f"- {res}", fill="black", font=fonts['small'])
         y += 25
         
     # Treatment
-    y += 30
-    d.text((50, y), "TRAITEMENT PRESCRIT:", fill="black", font=font_bold)
-    y += 30
+    y = IMAGE_TREATMENT_Y + 30
     
     medications = get_medications(patient_data.diagnosis)
     
     for med in medications:
-        d.text((80, y), f"- {med}", fill="black", font=font_small)
+        d.text((80, y), f"- {med}", fill="black", font=fonts['small'])
         y += 30
-        
-    # Footer
-    d.text((width/2, height-100), "Signature du Médecin:", fill="black", anchor="ms", font=font_medium)
     
     buffer = io.BytesIO()
     img.save(buffer, format='PNG')
     buffer.seek(0)
     return buffer
+
+DOCUMENT_RENDERERS = {
+    'pdf': generate_pdf,
+    'png': generate_prescription_image,
+}
+
+def render_document(kind, patient_data):
+    """Render one prescription ('pdf' or 'png') and return its bytes."""
+    return DOCUMENT_RENDERERS[kind](patient_data).getvalue()
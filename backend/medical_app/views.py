@@ -1,28 +1,24 @@
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
+import time
 from .forms import PatientForm
 from .models import PatientData
-from .ml_model import MedicalDiagnosisModel
+from .ml_model import get_model
+from .training_jobs import submit_training_job
 
-ml_model = MedicalDiagnosisModel()
+ml_model = get_model()
 
 def index(request):
     return render(request, 'medical_app/index.html')
 
 def train_model(request):
     if request.method == 'POST':
-        accuracy = ml_model.train_model()
-        tree_image = ml_model.visualize_tree()
-        feature_importance = ml_model.get_feature_importance()
-        
-        context = {
-            'accuracy': round(accuracy * 100, 2),
-            'tree_image': tree_image,
-            'feature_importance': feature_importance.to_dict('records') if feature_importance is not None else [],
-        }
-        return render(request, 'medical_app/dataset.html', context)
+        # Training runs in the background; the page polls /api/train/<job_id>/
+        job = submit_training_job(ml_model)
+        return render(request, 'medical_app/dataset.html', {'job': job})
     
     return render(request, 'medical_app/dataset.html')
 
@@ -32,28 +28,15 @@ def predict_diagnosis(request):
         if form.is_valid():
             patient = form.save(commit=False)
             
-            patient_data = {
-                'age': patient.age,
-                'gender': patient.gender,
-                'fever': 1 if patient.fever else 0,
-                'cough': 1 if patient.cough else 0,
-                'chest_pain': 1 if patient.chest_pain else 0,
-                'shortness_breath': 1 if patient.shortness_breath else 0,
-                'fatigue': 1 if patient.fatigue else 0,
-                'headache': 1 if patient.headache else 0,
-                'nausea': 1 if patient.nausea else 0,
-                'blood_pressure': patient.blood_pressure,
-                'cholesterol': patient.cholesterol,
-                'blood_sugar': patient.blood_sugar,
-                'smoking': 1 if patient.smoking else 0,
-                'obesity': 1 if patient.obesity else 0,
-                'family_history': 1 if patient.family_history else 0,
-            }
-            
-            diagnosis, probabilities = ml_model.predict(patient_data)
+            start = time.perf_counter()
+            diagnosis, probabilities = ml_model.predict(patient.features())
+            inference_ms = (time.perf_counter() - start) * 1000
             
             if diagnosis:
                 patient.diagnosis = diagnosis
+                patient.probabilities = probabilities
+                patient.model_version = ml_model.version
+                patient.inference_ms = inference_ms
                 patient.prediction_made = True
                 patient.save()
                 
@@ -71,39 +54,17 @@ def show_results(request, patient_id):
     try:
         patient = PatientData.objects.get(id=patient_id)
         
-        diagnosis_map = {
-            'SAIN': 'Patient Sain',
-            'DIABETE': 'Diabète',
-            'HYPER': 'Hypertension',
-            'CARDIAC': 'Problème Cardiaque',
-            'RESPIRATORY': 'Problème Respiratoire',
-        }
-        
-        # Recreate patient data for getting fresh diagnosis and probabilities
-        patient_data = {
-            'age': patient.age,
-            'gender': patient.gender,
-            'fever': 1 if patient.fever else 0,
-            'cough': 1 if patient.cough else 0,
-            'chest_pain': 1 if patient.chest_pain else 0,
-            'shortness_breath': 1 if patient.shortness_breath else 0,
-            'fatigue': 1 if patient.fatigue else 0,
-            'headache': 1 if patient.headache else 0,
-            'nausea': 1 if patient.nausea else 0,
-            'blood_pressure': patient.blood_pressure,
-            'cholesterol': patient.cholesterol,
-            'blood_sugar': patient.blood_sugar,
-            'smoking': 1 if patient.smoking else 0,
-            'obesity': 1 if patient.obesity else 0,
-            'family_history': 1 if patient.family_history else 0,
-        }
+        diagnosis_map = dict(PatientData.DIAGNOSIS_CHOICES)
         
-        # Get fresh diagnosis and probabilities
-        diagnosis, probabilities = ml_model.predict(patient_data)
+        # Stored with the prediction; rows saved before that fall back to
+        # the memoized predictor
+        probabilities = patient.probabilities
+        if probabilities is None:
+            _, probabilities = ml_model.predict(patient.features())
         
         context = {
             'patient': patient,
-            'diagnosis': diagnosis_map.get(diagnosis, diagnosis),  # Use fresh diagnosis, not stored one
+            'diagnosis': diagnosis_map.get(patient.diagnosis, patient.diagnosis),
             'probabilities': probabilities,
         }
         return render(request, 'medical_app/results.html', context)
@@ -111,12 +72,13 @@ def show_results(request, patient_id):
         return redirect('predict_diagnosis')
 
 def model_info(request):
-    ml_model.load_model()
-    tree_image = ml_model.visualize_tree()
+    ml_model.ensure_current()
     feature_importance = ml_model.get_feature_importance()
     
     context = {
-        'tree_image': tree_image,
+        # Served (and cached per model version) by the tree image endpoint
+        'tree_image_url': reverse('api_model_tree', args=['png']),
+        'tree_image_svg_url': reverse('api_model_tree', args=['svg']),
         'feature_importance': feature_importance.to_dict('records') if feature_importance is not None else [],
     }
     return render(request, 'medical_app/model_info.html', context)
@@ -0,0 +1,180 @@
+"""
+Write-behind buffer for prediction rows (group commit).
+
+With PREDICTION_WRITE_BUFFER on, /api/predict/ does not INSERT its row itself:
+it queues the unsaved PatientData and waits on a future. A flusher thread saves
+up to PREDICTION_WRITE_BATCH_SIZE queued rows in one bulk_create transaction,
+then resolves each future with its saved row (id and created_at set). Rows
+queued while a flush runs make up the next batch, so concurrent requests share
+one commit (one fsync, one SQLite write lock) instead of queueing for one each.
+PREDICTION_WRITE_INTERVAL_MS > 0 also holds each batch open that long to fill up.
+Requests block on their row, so a batch can never outgrow the number of
+concurrent requests, and a long interval only adds latency.
+
+Buffered rows are written outside the caller's transaction. A request that
+times out (WAIT_TIMEOUT) cancels its row if it is still queued, so a retry
+cannot create a duplicate; a row already in a flush is waited for instead.
+Rows still queued when the process exits are flushed by an atexit hook.
+"""
+import asyncio
+import atexit
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from .metrics import metrics
+from .models import PatientData
+
+# Longest a request waits for its row to be committed
+WAIT_TIMEOUT = 30
+
+
+class WriteBuffer:
+    def __init__(self, model, batch_size=100, interval=0.0):
+        self.model = model
+        self.batch_size = batch_size
+        self.interval = interval
+        self._pending = []  # (instance, future)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def submit(self, instance):
+        """Queue an unsaved instance; the future resolves to it once committed."""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Write buffer is closed")
+            # Started on first use, and again should it ever have died
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='write-buffer', daemon=True)
+                self._thread.start()
+            self._pending.append((instance, future))
+            if len(self._pending) in (1, self.batch_size):
+                self._cond.notify()
+        return future
+
+    def close(self, timeout=WAIT_TIMEOUT):
+        """Flush what is queued and stop the flusher thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+
+            # Leave the interval for concurrent requests to join the batch
+            deadline = time.monotonic() + self.interval
+            while len(self._pending) < self.batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            return batch
+
+    def _run(self):
+        try:
+            while True:
+                batch = self._next_batch()
+                if not batch:
+                    return  # Closed and drained
+                try:
+                    self._flush(batch)
+                except Exception as e:
+                    # Never let one batch stop the flusher: fail what it left unresolved
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+        finally:
+            connection.close()
+
+    def _flush(self, batch):
+        # Rows whose caller gave up (timeout) are dropped; the others can no
+        # longer be cancelled from here on
+        batch = [(instance, future) for instance, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        try:
+            # Honour CONN_MAX_AGE / CONN_HEALTH_CHECKS like a request would
+            close_old_connections()
+            with metrics.span('diagnosis_write_flush_seconds'):
+                with transaction.atomic():
+                    saved = self.model.objects.bulk_create([instance for instance, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        metrics.inc('diagnosis_write_batches_total')
+        metrics.inc('diagnosis_write_rows_total', len(batch))
+        for instance, (_, future) in zip(saved, batch):
+            future.set_result(instance)
+
+
+_buffer = None
+_buffer_pid = None
+_buffer_lock = threading.Lock()
+
+
+def get_write_buffer():
+    """The process's prediction write buffer, created on first use (and again after a fork)."""
+    global _buffer, _buffer_pid
+    with _buffer_lock:
+        if _buffer is None or _buffer_pid != os.getpid():
+            _buffer = WriteBuffer(
+                PatientData,
+                getattr(settings, 'PREDICTION_WRITE_BATCH_SIZE', 100),
+                getattr(settings, 'PREDICTION_WRITE_INTERVAL_MS', 0) / 1000
+            )
+            _buffer_pid = os.getpid()
+            atexit.register(_buffer.close)
+        return _buffer
+
+
+def _buffered():
+    return getattr(settings, 'PREDICTION_WRITE_BUFFER', False)
+
+
+def _timeout_error():
+    return FutureTimeoutError(f"Prediction not saved within {WAIT_TIMEOUT}s")
+
+
+def save_prediction(**fields):
+    """Create a PatientData row, through the write buffer when it is enabled."""
+    if not _buffered():
+        return PatientData.objects.create(**fields)
+
+    future = get_write_buffer().submit(PatientData(**fields))
+    try:
+        return future.result(WAIT_TIMEOUT)
+    except FutureTimeoutError:
+        # Still queued: drop it. Already being flushed: it will exist, wait for it
+        if future.cancel():
+            raise _timeout_error()
+        return future.result()
+
+
+async def asave_prediction(**fields):
+    """Async save_prediction."""
+    if not _buffered():
+        return await PatientData.objects.acreate(**fields)
+
+    future = get_write_buffer().submit(PatientData(**fields))
+    waiter = asyncio.wrap_future(future)
+    try:
+        # Shielded: the timeout must not cancel the row behind our back
+        return await asyncio.wait_for(asyncio.shield(waiter), WAIT_TIMEOUT)
+    except asyncio.TimeoutError:
+        if future.cancel():
+            raise _timeout_error()
+        return await waiter
@@ -0,0 +1,18 @@
+"""
+ASGI config for medical_project project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Serves every endpoint; the async views under /api/async/ only get their
+benefit here (see the README for running it under gunicorn with uvicorn workers).
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medical_project.settings')
+
+application = get_asgi_application()
@@ -28,8 +28,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'medical_app.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'medical_app.middleware.StaticFilesMiddleware',  # WhiteNoise, WSGI and ASGI
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # Add CORS middleware
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -62,12 +63,22 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Persistent connections, checked before reuse
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,  # Wait this many seconds for the write lock instead of failing
+        },
     }
 }
 
 # Database configuration for production
-db_from_env = dj_database_url.config(conn_max_age=600)
-DATABASES['default'].update(db_from_env)
+db_from_env = dj_database_url.config(conn_max_age=600, conn_health_checks=True)
+if db_from_env:
+    DATABASES['default'] = db_from_env
+
+# SQLite: write-ahead log, so readers never wait for the writer (medical_app.db)
+SQLITE_WAL = True
 
 LANGUAGE_CODE = 'fr-fr'
 TIME_ZONE = 'UTC'
@@ -90,6 +101,59 @@ if not DEBUG:
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Versioned model artifacts shared by all workers
+MODEL_REGISTRY_DIR = os.getenv('MODEL_REGISTRY_DIR', os.path.join(BASE_DIR, 'model_registry'))
+MODEL_REGISTRY_KEEP = 5
+
+# Training mode "search": k-fold cross-validation, folds run on MODEL_SEARCH_JOBS
+# processes (-1 = all cores); an estimator family stops after
+# MODEL_SEARCH_PATIENCE complexity levels (max_depth values) without a
+# MODEL_SEARCH_MIN_DELTA gain, and the quick configuration must be beaten by as much
+MODEL_SEARCH_FOLDS = 5
+MODEL_SEARCH_JOBS = int(os.getenv('MODEL_SEARCH_JOBS', -1))
+MODEL_SEARCH_PATIENCE = 2
+MODEL_SEARCH_MIN_DELTA = 0.001
+
+# Training source "database": confirmed cases are fetched TRAINING_FETCH_SIZE rows
+# at a time and cached as arrays, so retraining only reads newly confirmed rows
+TRAINING_DATA_CACHE = os.path.join(BASE_DIR, 'cache', 'training_data.npz')
+TRAINING_FETCH_SIZE = 5000
+TRAINING_MIN_SAMPLES = 50
+
+# Training jobs still PENDING/RUNNING after this many seconds are marked FAILED:
+# the worker process that owned them is gone (medical_app.training_jobs)
+TRAINING_JOB_TIMEOUT = int(os.getenv('TRAINING_JOB_TIMEOUT', 3600))
+
+# Memoized predictions per worker: (model version, features) -> result
+PREDICTION_CACHE_SIZE = 10000
+PREDICTION_CACHE_TTL = 3600  # seconds
+
+# Rendered decision tree images, one file per model version and format
+TREE_IMAGE_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'tree')
+
+# Rendered prescription PDFs/PNGs, keyed by content hash, LRU-evicted past the cap
+PRESCRIPTION_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'prescriptions')
+PRESCRIPTION_CACHE_MAX_BYTES = int(os.getenv('PRESCRIPTION_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Directory holding the prescription image fonts (e.g. DejaVuSans.ttf).
+# Unset: fall back to Arial/Helvetica lookup, then Pillow's default font.
+PRESCRIPTION_FONT_DIR = os.getenv('PRESCRIPTION_FONT_DIR')
+
+# Process pool size for bulk prescription rendering (default: one per CPU)
+PRESCRIPTION_RENDER_WORKERS = None
+
+# Group commit of /api/predict/ rows (medical_app.write_buffer): one bulk INSERT
+# of up to PREDICTION_WRITE_BATCH_SIZE rows. 0 ms: flush whenever the flusher is
+# free, rows arriving during a flush make the next batch; more: also wait that
+# long for a batch to fill
+PREDICTION_WRITE_BUFFER = os.getenv('PREDICTION_WRITE_BUFFER', 'False') == 'True'
+PREDICTION_WRITE_BATCH_SIZE = 100
+PREDICTION_WRITE_INTERVAL_MS = 0
+
+# ASGI (/api/async/): threads running model inference and document rendering
+# off the event loop; requests beyond this many wait for a free thread
+ASYNC_EXECUTOR_WORKERS = int(os.getenv('ASYNC_EXECUTOR_WORKERS', 4))
+
 # CORS Configuration  
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",  # Vite dev server
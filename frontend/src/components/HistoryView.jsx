@@ -4,6 +4,9 @@ import { medicalAPI } from '../services/api';
 const HistoryView = () => {
     const [history, setHistory] = useState([]);
     const [loading, setLoading] = useState(true);
+    // Cursor of the next (older) page, null once everything is loaded
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
 
     useEffect(() => {
         fetchHistory();
@@ -12,7 +15,8 @@ const HistoryView = () => {
     const fetchHistory = async () => {
         try {
             const data = await medicalAPI.getHistory();
-            setHistory(data);
+            setHistory(data.results);
+            setNextCursor(data.next);
         } catch (error) {
             console.error('Error fetching history:', error);
         } finally {
@@ -20,6 +24,19 @@ const HistoryView = () => {
         }
     };
 
+    const loadMore = async () => {
+        setLoadingMore(true);
+        try {
+            const data = await medicalAPI.getHistory(nextCursor);
+            setHistory((previous) => [...previous, ...data.results]);
+            setNextCursor(data.next);
+        } catch (error) {
+            console.error('Error fetching history:', error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const diagnosisMap = {
         'SAIN': 'Patient Sain',
         'DIABETE': 'Diabète',
@@ -103,6 +120,16 @@ const HistoryView = () => {
                     </div>
                 </div>
             ))}
+
+            {nextCursor && (
+                <button
+                    onClick={loadMore}
+                    disabled={loadingMore}
+                    className="btn-primary"
+                >
+                    {loadingMore ? 'Chargement...' : 'Charger plus'}
+                </button>
+            )}
         </div>
     );
 };
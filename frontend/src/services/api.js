@@ -10,9 +10,15 @@ const api = axios.create({
 });
 
 export const medicalAPI = {
-    // Train the ML model
-    trainModel: async () => {
-        const response = await api.post('/train/');
+    // Start a background training job ('quick' or cross-validated 'search')
+    trainModel: async (mode = 'quick') => {
+        const response = await api.post('/train/', { mode });
+        return response.data;
+    },
+
+    // Poll a training job (status, accuracy, timings)
+    getTrainingJob: async (jobId) => {
+        const response = await api.get(`/train/${jobId}/`);
         return response.data;
     },
 
@@ -22,10 +28,18 @@ export const medicalAPI = {
         return response.data;
     },
 
-    // Get prediction history
-    getHistory: async () => {
-        const response = await api.get('/history/');
-        return response.data;
+    // Get one page of prediction history (only the columns the list shows).
+    // Pass the returned `next` cursor to get the following (older) page; it is
+    // null on the last page.
+    getHistory: async (cursor = null, params = {}) => {
+        const response = await api.get('/history/', {
+            params: { fields: 'id,created_at,diagnosis,age,gender', ...params, ...(cursor && { cursor }) },
+        });
+        const { results, next } = response.data;
+        return {
+            results,
+            next: next ? new URL(next).searchParams.get('cursor') : null,
+        };
     },
 
     // Get specific result
@@ -33,6 +47,12 @@ export const medicalAPI = {
         const response = await api.get(`/results/${id}/`);
         return response.data;
     },
+
+    // Confirm a diagnosis (optionally corrected) so it is used for training
+    confirmDiagnosis: async (id, diagnosis) => {
+        const response = await api.post(`/results/${id}/confirm/`, diagnosis ? { diagnosis } : {});
+        return response.data;
+    },
 };
 
 export default api;